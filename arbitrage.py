@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from fees import FeeProfile, hauling_profit
+from spread_kernel import type_codes
+from topk import TopKAccumulator
+
+
+def hub_price_matrices(hub_best: dict) -> tuple:
+    """Lay the best prices of every hub out as (hub, type) matrices over the union of the hubs' type ids.
+
+    `hub_best` maps station ids to their `BestBidAsk`. Prices a hub has no order for are NaN.
+    Returns the station ids, the type ids and the best ask and best bid matrices.
+    """
+    station_ids = np.array(list(hub_best))
+    type_ids, hub_codes = type_codes(*(best.type_ids for best in hub_best.values()))
+    best_ask = np.full((len(station_ids), len(type_ids)), np.nan)
+    best_bid = np.full((len(station_ids), len(type_ids)), np.nan)
+    for hub, (best, codes) in enumerate(zip(hub_best.values(), hub_codes)):
+        best_ask[hub, codes] = np.where(best.ask_positions >= 0, best.best_ask, np.nan)
+        best_bid[hub, codes] = np.where(best.bid_positions >= 0, best.best_bid, np.nan)
+    return station_ids, type_ids, best_ask, best_bid
+
+
+def buy_hub_profits(best_ask: np.ndarray, best_bid: np.ndarray, buy_hub: int, fee_profile: FeeProfile,
+                    relist: bool = False) -> tuple:
+    """Return the (sell hub, type) net profit and ROI of buying at `buy_hub`'s best ask and selling at another hub.
+
+    This is one row of the hub-to-hub profit matrix. Selling fills the destination's best bid, or with `relist`
+    matches its best ask, and pays the fees of `fee_profile`. Both are NaN where either hub lacks the order and
+    for `buy_hub` itself.
+    """
+    sell_prices = best_ask if relist else best_bid
+    profit, roi = hauling_profit(best_ask[buy_hub], sell_prices, fee_profile, relist)
+    profit[buy_hub] = np.nan
+    roi[buy_hub] = np.nan
+    return profit, roi
+
+
+def top_arbitrage(hub_best: dict, top: int, minimal_profit: float, fee_profile: FeeProfile = FeeProfile(),
+                  minimal_roi: float = 0.0, relist: bool = False) -> pd.DataFrame:
+    """Find the `top` most profitable hub-to-hub trades, most profitable first.
+
+    Trades are kept on their net profit and ROI after the fees of `fee_profile`. The profit matrix is computed one
+    buy hub at a time and each row is merged into a `TopKAccumulator`, so at most one row is held at once.
+    """
+    station_ids, type_ids, best_ask, best_bid = hub_price_matrices(hub_best)
+    accumulator = TopKAccumulator(top)
+    for buy_hub in range(len(station_ids)):
+        profit, roi = buy_hub_profits(best_ask, best_bid, buy_hub, fee_profile, relist)
+        candidates = np.flatnonzero((profit >= minimal_profit) & (roi >= minimal_roi))
+        accumulator.add(profit.flat[candidates], buy_hub * profit.size + candidates)
+    trades = np.array(accumulator.items(), dtype=np.int64)
+    buy_hubs, sell_hubs, codes = np.unravel_index(trades, (len(station_ids), *best_ask.shape))
+
+    sell_prices = (best_ask if relist else best_bid)[sell_hubs, codes]
+    profit, roi = hauling_profit(best_ask[buy_hubs, codes], sell_prices, fee_profile, relist)
+    return pd.DataFrame({
+        'type_id': type_ids[codes],
+        'buy_station_id': station_ids[buy_hubs],
+        'sell_station_id': station_ids[sell_hubs],
+        'price_buy_hub': best_ask[buy_hubs, codes],
+        'price_sell_hub': sell_prices,
+        'net_profit': profit,
+        'roi': roi,
+    })
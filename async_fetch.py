@@ -0,0 +1,139 @@
+import asyncio
+import logging
+
+import aiohttp
+from multidict import CIMultiDict
+
+from constants import (REGION_IDS, ASYNC_LIMIT_PER_HOST, MAX_RETRIES, BACKOFF_FACTOR, MARKET_ORDERS_URL,
+                       FETCH_ALL_ORDER_TYPES, DECODE_ORDER_COLUMNS)
+from esi_cache import (load_cached_page, store_cached_page, conditional_request_headers, load_snapshot,
+                       store_snapshot)
+from esi_governor import governor
+from http_client import create_async_session
+from market_orders import (split_orders_by_side, collect_order_pages, order_types_to_fetch, order_pages_decoder,
+                           BestOrderReducer, OrderBookStream, PAGINATION_HEADERS)
+
+
+async def run_blocking(function, *args):
+    """Run `function`, e.g. cache file I/O and pickling, on the default thread pool instead of the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+async def fetch_with_retries_async(session: aiohttp.ClientSession, url: str, max_retries: int = MAX_RETRIES,
+                                   backoff_factor: int = BACKOFF_FACTOR, decoder=None) -> tuple:
+    """Fetch data from the API with retry logic, returning the decoded body together with the response headers.
+
+    The body is decoded as JSON, or by `decoder` from the raw bytes when given.
+    Pages seen before are revalidated with their ETag; on 304 Not Modified the cached body is returned.
+    Every attempt waits for the shared error limit governor first. The page cache is read and written off the
+    event loop.
+    """
+    cached_page = await run_blocking(load_cached_page, url, decoder)
+    retries = 0
+    while retries < max_retries:
+        try:
+            await governor.wait_async()
+            async with session.get(url, headers=conditional_request_headers(cached_page)) as response:
+                governor.update(response.headers)
+                if response.status == 304:
+                    headers = CIMultiDict(cached_page['headers'])
+                    headers.update(response.headers)
+                    return cached_page['data'], headers
+                elif response.status == 200:
+                    try:
+                        data = await response.json() if decoder is None else decoder(await response.read())
+                    except (aiohttp.ContentTypeError, ValueError):
+                        logging.warning(f"Invalid JSON response: {await response.text()}")
+                        return None, response.headers
+                    await run_blocking(store_cached_page, url, response.headers, data, decoder)
+                    return data, response.headers
+                logging.warning(f"Error fetching data: {await response.text()}, retrying...\n Failed URL: {url}")
+        except aiohttp.ClientError as e:
+            logging.warning(f"Error fetching data: {e}, retrying...\n Failed URL: {url}")
+        retries += 1
+        await asyncio.sleep(backoff_factor ** retries)  # Exponential backoff
+    logging.error(f"Failed to fetch data after {max_retries} retries.")
+    return None, {}
+
+
+async def fetch_orders_async(session: aiohttp.ClientSession, region_id: int, order_type: str,
+                             decoder=None) -> tuple:
+    """Fetch every page of one order type in a region; page 1 also tells how many pages there are.
+
+    An order book whose snapshot has not expired yet is served from disk without any request.
+    Returns the orders together with the pagination headers of page 1.
+    """
+    snapshot = await run_blocking(load_snapshot, region_id, order_type, decoder)
+    if snapshot is not None:
+        return snapshot
+
+    url = MARKET_ORDERS_URL.format(region_id=region_id, order_type=order_type)
+    first_page, headers = await fetch_with_retries_async(session, url+'&page=1', decoder=decoder)
+    page_headers = {header: headers.get(header) for header in PAGINATION_HEADERS}
+    remaining_pages = await asyncio.gather(*(fetch_with_retries_async(session, url+f'&page={page}', decoder=decoder)
+                                             for page in range(2, int(headers['x-pages'])+1)))
+    orders = collect_order_pages(first_page, page_headers, remaining_pages)
+    await run_blocking(store_snapshot, region_id, order_type, orders, page_headers, decoder)
+    return orders, page_headers
+
+
+async def stream_orders_async(session: aiohttp.ClientSession, region_id: int, order_type: str,
+                              reducer: BestOrderReducer, decoder=None) -> None:
+    """Fold every page of one order type in a region into `reducer` as it arrives, see `OrderBookStream`."""
+    stream = OrderBookStream(reducer)
+    if stream.add_snapshot(await run_blocking(load_snapshot, region_id, order_type, decoder)):
+        return
+
+    url = MARKET_ORDERS_URL.format(region_id=region_id, order_type=order_type)
+    remaining_pages = stream.add_first_page(*await fetch_with_retries_async(session, url+'&page=1', decoder=decoder))
+
+    async def fetch_page(page: int) -> tuple:
+        return (page, *await fetch_with_retries_async(session, url+f'&page={page}', decoder=decoder))
+
+    for next_page in asyncio.as_completed([fetch_page(page) for page in remaining_pages]):
+        stream.add_page(*await next_page)
+
+
+async def fetch_region_orders_async(session: aiohttp.ClientSession, region_id: int,
+                                    all_order_types: bool = FETCH_ALL_ORDER_TYPES, station_ids: list = None,
+                                    decode_columns: bool = DECODE_ORDER_COLUMNS) -> tuple:
+    """Fetch the sell and buy orders of a region, either as one `order_type=all` pagination or two concurrent ones.
+
+    Given `station_ids`, pages are streamed into a `BestOrderReducer` and only the best sell and buy order of
+    every type at each of those stations are returned. With `decode_columns` the orders are dicts of typed columns.
+    """
+    decoder = order_pages_decoder(decode_columns)
+    if station_ids is not None:
+        reducer = BestOrderReducer(station_ids)
+        await asyncio.gather(*(stream_orders_async(session, region_id, order_type, reducer, decoder)
+                               for order_type in order_types_to_fetch(all_order_types)))
+        return reducer.sell_orders(), reducer.buy_orders()
+    if all_order_types:
+        orders, _ = await fetch_orders_async(session, region_id, 'all', decoder)
+        return split_orders_by_side(orders)
+    (sell_orders, _), (buy_orders, _) = await asyncio.gather(fetch_orders_async(session, region_id, 'sell', decoder),
+                                                             fetch_orders_async(session, region_id, 'buy', decoder))
+    return sell_orders, buy_orders
+
+
+async def _fetch_regions_orders(region_ids: list, limit_per_host: int, all_order_types: bool,
+                                hub_station_ids: dict, decode_columns: bool) -> dict:
+    async with create_async_session(limit_per_host) as session:
+        results = await asyncio.gather(*(fetch_region_orders_async(session, region_id, all_order_types,
+                                                                    (hub_station_ids or {}).get(region_id),
+                                                                    decode_columns)
+                                         for region_id in region_ids))
+    return dict(zip(region_ids, results))
+
+
+def fetch_regions_orders(region_ids: list = REGION_IDS, limit_per_host: int = ASYNC_LIMIT_PER_HOST,
+                         all_order_types: bool = FETCH_ALL_ORDER_TYPES, hub_station_ids: dict = None,
+                         decode_columns: bool = DECODE_ORDER_COLUMNS) -> dict:
+    """Fetch every page of every region over one event loop.
+
+    At most `limit_per_host` connections to ESI are open at once; the remaining requests wait in the connector's queue.
+    Returns a dict mapping each region id to a `(sell_orders, buy_orders)` tuple. Regions listed in `hub_station_ids`
+    are streamed and reduced to the best orders at their hub stations, see `fetch_region_orders_async`.
+    """
+    return asyncio.run(_fetch_regions_orders(region_ids, limit_per_host, all_order_types, hub_station_ids,
+                                             decode_columns))
@@ -0,0 +1,68 @@
+"""Compare the cold start of the type names as a dict literal module and as the memory-mapped table.
+
+Each variant runs in a fresh interpreter that looks up one name. The dict literal is timed both compiled from
+source, as on a first run, and loaded from its cached bytecode. Linux/macOS only (peak RSS comes from `resource`).
+
+Run from the project root: python benchmarks/cold_start.py [--repeat N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from constants import TYPE_NAMES_PATH  # noqa: E402
+from type_names import TypeNameTable  # noqa: E402
+
+PEAK_RSS = "import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def write_dict_module(directory: str) -> None:
+    """Write the type names as the dict literal constants.py used to hold."""
+    with open(os.path.join(directory, 'type_id_name_map.py'), 'w', encoding='utf-8') as module:
+        module.write('TYPE_ID_NAME_MAP = {\n')
+        for type_id, name in TypeNameTable(TYPE_NAMES_PATH).items():
+            module.write(f'    {type_id}: {name!r},\n')
+        module.write('}\n')
+
+
+def run(code: str, repeat: int, python_flags: tuple = ()) -> tuple:
+    """Return the best wall time and the peak RSS in MiB of running `code` in a fresh interpreter."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, *python_flags, '-c', f'{code}; {PEAK_RSS}'], check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(time.perf_counter() - start)
+    peak_rss = int(output.split()[-1]) / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+    return min(timings), peak_rss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_dict_module(directory)
+        dict_lookup = (f"import sys; sys.path.insert(0, {directory!r}); import type_id_name_map; "
+                       f"type_id_name_map.TYPE_ID_NAME_MAP[34]")
+        table_lookup = (f"import sys; sys.path.insert(0, {PROJECT_ROOT!r}); from type_names import TypeNameTable; "
+                        f"TypeNameTable({TYPE_NAMES_PATH!r})[34]")
+        results = {
+            'interpreter only': run('pass', args.repeat),
+            'dict literal, compiled': run(dict_lookup, args.repeat, ('-B',)),
+            'dict literal, cached bytecode': (run(dict_lookup, 1), run(dict_lookup, args.repeat))[1],
+            'memory-mapped table': run(table_lookup, args.repeat),
+        }
+
+    for variant, (seconds, peak_rss) in results.items():
+        print(f"{variant:30} {seconds * 1000:8.1f} ms {peak_rss:8.1f} MiB peak RSS")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Compare decoding ESI order pages as JSON dicts and as the typed columns of `decode_order_columns`.
+
+Pages hold 1000 orders, like ESI's. The columns are timed with the json module and, when it is installed, orjson.
+
+Run from the project root: python benchmarks/decode_orders.py [--pages N] [--repeat N]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import market_orders  # noqa: E402
+from benchmarks.spread_kernel import generate_orders, best_time  # noqa: E402
+from market_orders import decode_order_columns  # noqa: E402
+
+ORDERS_PER_PAGE = 1000
+
+
+def generate_pages(page_count: int) -> list:
+    """Generate ESI-shaped order page bodies."""
+    orders = generate_orders(page_count * ORDERS_PER_PAGE, 15_000)
+    orders['issued'] = orders['issued'].astype(str)
+    return [orders.iloc[start:start + ORDERS_PER_PAGE].to_json(orient='records').encode()
+            for start in range(0, len(orders), ORDERS_PER_PAGE)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = generate_pages(args.pages)
+    orjson = market_orders.orjson
+    timings = {'json.loads, dicts': best_time(lambda: [json.loads(page) for page in pages], args.repeat)[0]}
+    market_orders.orjson = None
+    timings['columns, json'] = best_time(lambda: [decode_order_columns(page) for page in pages], args.repeat)[0]
+    market_orders.orjson = orjson
+    if orjson is not None:
+        timings['columns, orjson'] = best_time(lambda: [decode_order_columns(page) for page in pages],
+                                               args.repeat)[0]
+
+    print(f"{args.pages} pages of {ORDERS_PER_PAGE} orders, ms per page")
+    for variant, seconds in timings.items():
+        print(f"{variant:20} {seconds * 1000 / args.pages:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare the memory of a region's orders as default DataFrames and as compact ones, column by column.
+
+Also reports the peak memory allocated while building each from decoded orders, and while computing the hub
+spreads from them, as traced by `tracemalloc` on top of the decoded orders themselves.
+
+Run from the project root: python benchmarks/memory_report.py [--orders N] [--types N]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.spread_kernel import generate_orders  # noqa: E402
+from constants import JITA_STATION_ID, MINIMAL_NET_PROFIT  # noqa: E402
+from fees import FeeProfile, net_spread_table  # noqa: E402
+from market_orders import order_frame, split_orders_by_side  # noqa: E402
+from spread_kernel import hub_best_prices  # noqa: E402
+
+
+def hub_spreads(sell_orders: list, buy_orders: list) -> dict:
+    """Compute the Jita spread table from decoded orders the way `main.compute_marketspread_dfs` does."""
+    df_sell_orders = order_frame(sell_orders)
+    df_buy_orders = order_frame(buy_orders)
+    return {station_id: net_spread_table(df_sell_orders, df_buy_orders, best, FeeProfile(), MINIMAL_NET_PROFIT, 0.0)
+            for station_id, best in hub_best_prices(df_sell_orders, df_buy_orders, [JITA_STATION_ID]).items()}
+
+
+def peak_allocated(function) -> float:
+    """Return the peak MiB allocated while running `function`, whatever it returns included."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=400_000)
+    parser.add_argument('--types', type=int, default=15_000)
+    args = parser.parse_args()
+
+    orders = generate_orders(args.orders, args.types).to_dict('records')
+    default_usage = pd.DataFrame(orders).memory_usage(deep=True)
+    compact_frame = order_frame(orders)
+    compact_usage = compact_frame.memory_usage(deep=True).rename({'price_cents': 'price'})
+
+    report = pd.DataFrame({'default': default_usage, 'compact': compact_usage,
+                           'compact dtype': compact_frame.dtypes.rename({'price_cents': 'price'})})
+    report.loc['total', ['default', 'compact']] = default_usage.sum(), compact_usage.sum()
+    report[['default', 'compact']] = (report[['default', 'compact']] / 2 ** 20).round(2)
+
+    print(f"{len(orders)} orders, MiB per column")
+    print(report.fillna('').to_string())
+    print(f"compact frames are {default_usage.sum() / compact_usage.sum():.1f}x smaller")
+
+    sell_orders, buy_orders = split_orders_by_side(orders)
+    peaks = {
+        'default DataFrame': peak_allocated(lambda: pd.DataFrame(orders)),
+        'compact order_frame': peak_allocated(lambda: order_frame(orders)),
+        'hub spreads, from decoded orders': peak_allocated(lambda: hub_spreads(sell_orders, buy_orders)),
+    }
+    print("\nPeak MiB allocated")
+    for step, peak in peaks.items():
+        print(f"{step:35} {peak:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Compare the groupby/idxmin + merge spread computation with the vectorized kernel on a Forge-sized order book.
+
+The kernel is timed the way `main.compute_marketspread_dfs` runs it, `hub_best_prices` then `net_spread_table`
+over the whole region's compact orders, and checked against the best prices and net profits of the baseline.
+
+Run from the project root: python benchmarks/spread_kernel.py [--orders N] [--types N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import JITA_STATION_ID, MINIMAL_SPREAD, MINIMAL_NET_PROFIT  # noqa: E402
+from fees import FeeProfile, net_spread_table, station_trading_profit  # noqa: E402
+from market_orders import order_frame  # noqa: E402
+from spread_kernel import hub_best_prices  # noqa: E402
+
+
+def generate_orders(order_count: int, type_count: int, seed: int = 0) -> pd.DataFrame:
+    """Generate an ESI-shaped order book, about half of it at Jita."""
+    rng = np.random.default_rng(seed)
+    is_buy_order = rng.random(order_count) < 0.4
+    base_prices = rng.lognormal(13, 3, type_count).round(2)
+    type_ids = rng.integers(0, type_count, order_count)
+    markup = np.where(is_buy_order, rng.uniform(0.5, 1.0, order_count), rng.uniform(1.0, 2.0, order_count))
+    return pd.DataFrame({
+        'duration': rng.choice([90, 30, 14], order_count),
+        'is_buy_order': is_buy_order,
+        'issued': '2024-01-01T00:00:00Z',
+        'location_id': np.where(rng.random(order_count) < 0.5, JITA_STATION_ID,
+                                rng.integers(60000000, 60015000, order_count)),
+        'min_volume': 1,
+        'order_id': np.arange(6_000_000_000, 6_000_000_000 + order_count),
+        'price': (base_prices[type_ids] * markup).round(2),
+        'range': rng.choice(['region', 'station', 'solarsystem', '5'], order_count),
+        'system_id': 30000142,
+        'type_id': type_ids + 34,
+        'volume_remain': rng.integers(1, 1000, order_count),
+        'volume_total': 1000,
+    })
+
+
+def groupby_merge_spreads(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame,
+                          minimal_spread: float) -> pd.DataFrame:
+    """The spread computation the kernel replaced, on one station's orders."""
+    df_sell_orders_min_price = df_sell_orders.loc[df_sell_orders.groupby('type_id')['price'].idxmin()]
+    df_buy_orders_max_price = df_buy_orders.loc[df_buy_orders.groupby('type_id')['price'].idxmax()]
+    df_combined = pd.merge(df_sell_orders_min_price, df_buy_orders_max_price, on='type_id', how='outer',
+                           suffixes=('_sell', '_buy'))
+    df_combined['price_sell'] = df_combined['price_sell'].fillna(0)
+    df_combined['price_buy'] = df_combined['price_buy'].fillna(0)
+    df_combined['market_spread_station_only'] = df_combined['price_sell'] - df_combined['price_buy']
+    return df_combined[df_combined['market_spread_station_only'] >= minimal_spread]
+
+
+def best_time(function, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def kernel_spreads(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame) -> pd.DataFrame:
+    """The spread computation `main` runs, for the Jita hub of a region's compact orders."""
+    best = hub_best_prices(df_sell_orders, df_buy_orders, [JITA_STATION_ID])[JITA_STATION_ID]
+    return net_spread_table(df_sell_orders, df_buy_orders, best, FeeProfile(), MINIMAL_NET_PROFIT, 0.0)
+
+
+def check_kernel(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, df_sell_compact: pd.DataFrame,
+                 df_buy_compact: pd.DataFrame, result: pd.DataFrame) -> None:
+    """Check the kernel's best prices and kept types against the baseline's."""
+    expected = groupby_merge_spreads(df_sell_orders, df_buy_orders, -np.inf).sort_values('type_id')
+    best = hub_best_prices(df_sell_compact, df_buy_compact, [JITA_STATION_ID])[JITA_STATION_ID]
+    np.testing.assert_array_equal(best.type_ids, expected['type_id'])
+    np.testing.assert_allclose(best.best_ask, expected['price_sell'])
+    np.testing.assert_allclose(best.best_bid, expected['price_buy'])
+
+    net_profit, _ = station_trading_profit(expected['price_sell'].to_numpy(), expected['price_buy'].to_numpy(),
+                                           FeeProfile())
+    kept = (net_profit >= MINIMAL_NET_PROFIT) & (expected['price_sell'] > 0) & (expected['price_buy'] > 0)
+    np.testing.assert_array_equal(np.sort(result['type_id']), expected['type_id'][kept])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=400_000)
+    parser.add_argument('--types', type=int, default=15_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    orders = generate_orders(args.orders, args.types)
+    df_sell_orders = orders[~orders['is_buy_order']]
+    df_buy_orders = orders[orders['is_buy_order']]
+    df_sell_compact = order_frame(df_sell_orders.reset_index(drop=True))
+    df_buy_compact = order_frame(df_buy_orders.reset_index(drop=True))
+
+    def baseline() -> pd.DataFrame:
+        return groupby_merge_spreads(df_sell_orders[df_sell_orders['location_id'] == JITA_STATION_ID],
+                                     df_buy_orders[df_buy_orders['location_id'] == JITA_STATION_ID], MINIMAL_SPREAD)
+
+    baseline_time, _ = best_time(baseline, args.repeat)
+    kernel_time, result = best_time(lambda: kernel_spreads(df_sell_compact, df_buy_compact), args.repeat)
+    check_kernel(df_sell_orders[df_sell_orders['location_id'] == JITA_STATION_ID],
+                 df_buy_orders[df_buy_orders['location_id'] == JITA_STATION_ID], df_sell_compact, df_buy_compact,
+                 result)
+
+    print(f"{len(df_sell_orders)} sell and {len(df_buy_orders)} buy orders in the region, {len(result)} Jita "
+          f"spreads kept")
+    print(f"{'groupby/idxmin + merge:':36}{baseline_time * 1000:8.1f} ms")
+    speedup = baseline_time / kernel_time
+    print(f"{'hub_best_prices + net_spread_table:':36}{kernel_time * 1000:8.1f} ms ({speedup:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from spread_kernel import order_prices
+
+
+class DepthVWAP(NamedTuple):
+    """Volume filled and volume weighted average price of walking each side of the book of every type at a hub.
+
+    Arrays are aligned with the `type_ids` of the hub's `BestBidAsk`. A side without orders fills 0 at a NaN price.
+    """
+    sell_volume: np.ndarray
+    vwap_sell: np.ndarray
+    buy_volume: np.ndarray
+    vwap_buy: np.ndarray
+
+
+def walk_order_book(groups: np.ndarray, prices: np.ndarray, volumes: np.ndarray, group_count: int,
+                    quantity: float = None, budget: float = None, highest: bool = False) -> tuple:
+    """Walk the orders of every group from the best price on, filling up to `quantity` units or `budget` ISK.
+
+    The best price is the lowest one, or the highest with `highest`. Running totals within each group come from
+    one cumulative sum over all orders, offset by its value where the group starts.
+    Returns the volume filled and the VWAP of every group.
+    """
+    order = np.lexsort((-prices if highest else prices, groups))
+    groups = groups[order]
+    prices = prices[order].astype(np.float64)
+    volumes = volumes[order].astype(np.float64)
+    group_starts = np.searchsorted(groups, groups)
+
+    if quantity is not None:
+        volume_before = np.cumsum(volumes) - volumes
+        volume_before -= volume_before[group_starts]
+        fills = np.clip(quantity - volume_before, 0, volumes)
+    else:
+        costs = prices * volumes
+        spent_before = np.cumsum(costs) - costs
+        spent_before -= spent_before[group_starts]
+        fills = np.clip(np.floor((budget - spent_before) / prices), 0, volumes)
+
+    filled_volume = np.bincount(groups, fills, group_count)
+    filled_cost = np.bincount(groups, fills * prices, group_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return filled_volume, filled_cost / filled_volume
+
+
+def _hub_type_groups(location_ids: np.ndarray, type_ids: np.ndarray, hub_keys: np.ndarray,
+                     station_ids: np.ndarray, key_base: int) -> tuple:
+    """Return the rows of orders at a hub and their group, the position of their (hub, type) key in `hub_keys`.
+
+    Orders of types missing from `hub_keys` are left out.
+    """
+    rows = np.flatnonzero(np.isin(location_ids, station_ids))
+    sorter = np.argsort(station_ids)
+    hubs = sorter[np.searchsorted(station_ids, location_ids[rows], sorter=sorter)]
+    keys = hubs.astype(np.int64) * key_base + type_ids[rows]
+    groups = np.minimum(np.searchsorted(hub_keys, keys), max(len(hub_keys) - 1, 0))
+    found = hub_keys[groups] == keys if len(hub_keys) else np.zeros(len(keys), dtype=bool)
+    return rows[found], groups[found]
+
+
+def hub_depth(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, hub_best: dict, quantity: float = None,
+              budget: float = None) -> dict:
+    """Walk the sell and buy orders of every type at each hub in `hub_best` up to `quantity` units or `budget` ISK.
+
+    Sell orders are walked from the lowest price up and buy orders from the highest price down, using
+    `volume_remain`. Returns a dict mapping each station id to its `DepthVWAP`.
+    """
+    station_ids = np.array(list(hub_best))
+    hub_type_ids = [best.type_ids for best in hub_best.values()]
+    key_base = int(max((type_ids.max() + 1 for type_ids in hub_type_ids if len(type_ids)), default=1))
+    hub_keys = np.concatenate([hub * key_base + type_ids.astype(np.int64)
+                               for hub, type_ids in enumerate(hub_type_ids)] or [np.array([], dtype=np.int64)])
+    bounds = np.cumsum([len(type_ids) for type_ids in hub_type_ids])[:-1]
+
+    walks = []
+    for df_orders, highest in ((df_sell_orders, False), (df_buy_orders, True)):
+        rows, groups = _hub_type_groups(df_orders['location_id'].to_numpy(), df_orders['type_id'].to_numpy(),
+                                        hub_keys, station_ids, key_base)
+        filled_volume, vwap = walk_order_book(groups, order_prices(df_orders)[rows],
+                                              df_orders['volume_remain'].to_numpy()[rows], len(hub_keys), quantity,
+                                              budget, highest)
+        walks.append((np.split(filled_volume, bounds), np.split(vwap, bounds)))
+
+    (sell_volumes, vwaps_sell), (buy_volumes, vwaps_buy) = walks
+    return {station_id: DepthVWAP(sell_volume, vwap_sell, buy_volume, vwap_buy)
+            for station_id, sell_volume, vwap_sell, buy_volume, vwap_buy
+            in zip(hub_best, sell_volumes, vwaps_sell, buy_volumes, vwaps_buy)}
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from email.utils import parsedate_to_datetime
+
+from constants import ESI_CACHE_DIR
+from market_orders import PAGINATION_HEADERS
+
+
+def _cache_path(url: str, decoder) -> str:
+    key = url if decoder is None else f'{url}#{decoder.__name__}'  # Pages decoded differently are cached apart
+    return os.path.join(ESI_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+
+def _snapshot_path(region_id: int, order_type: str, decoder, extension: str) -> str:
+    name = f'snapshot-{region_id}-{order_type}'
+    if decoder is not None:
+        name += f'-{decoder.__name__}'
+    return os.path.join(ESI_CACHE_DIR, f'{name}.{extension}')
+
+
+def _write_atomically(path: str, write, mode: str = 'wb') -> None:
+    """Write through a temporary file renamed into place, so concurrent readers never see a half-written file."""
+    os.makedirs(ESI_CACHE_DIR, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.{id(write)}.tmp'
+    with open(temporary_path, mode) as file:
+        write(file)
+    os.replace(temporary_path, path)
+
+
+def load_cached_page(url: str, decoder=None):
+    """Return the cached `{'headers': ..., 'data': ...}` entry of a page, or None when it is not cached.
+
+    `decoder` is the function the page body was decoded with, None for plain JSON.
+    """
+    if not ESI_CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(url, decoder), 'rb') as cache_file:
+            return pickle.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError) as e:
+        logging.warning(f"Ignoring corrupt cache entry for {url}: {e}")
+        return None
+
+
+def store_cached_page(url: str, headers, data, decoder=None) -> None:
+    """Cache a decoded page together with its pagination headers, ETag and Expires included."""
+    if not ESI_CACHE_DIR or not headers.get('etag'):
+        return
+    entry = {'headers': {header: headers.get(header) for header in PAGINATION_HEADERS}, 'data': data}
+    _write_atomically(_cache_path(url, decoder),
+                      lambda cache_file: pickle.dump(entry, cache_file, pickle.HIGHEST_PROTOCOL))
+
+
+def conditional_request_headers(cached_page) -> dict:
+    """Return the `If-None-Match` header revalidating a cached page, so ESI answers 304 if it did not change."""
+    if cached_page is None:
+        return {}
+    return {'If-None-Match': cached_page['headers']['etag']}
+
+
+def snapshot_expires_at(region_id: int, order_type: str, decoder=None):
+    """Return when the snapshot of an order book stops matching ESI's cache (a Unix timestamp), or None."""
+    if not ESI_CACHE_DIR:
+        return None
+    try:
+        with open(_snapshot_path(region_id, order_type, decoder, 'json')) as metadata_file:
+            return json.load(metadata_file)['expires_at']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def load_snapshot(region_id: int, order_type: str, decoder=None, include_expired: bool = False):
+    """Return the `(orders, page_headers)` snapshot of an order book while ESI would still serve the same data.
+
+    Returns None once the snapshot's Expires time has passed, unless `include_expired` (e.g. to replay it), or when
+    there is no snapshot.
+    """
+    expires_at = snapshot_expires_at(region_id, order_type, decoder)
+    if not include_expired and (expires_at is None or expires_at <= time.time()):
+        return None
+    try:
+        with open(_snapshot_path(region_id, order_type, decoder, 'pickle'), 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    logging.info(f"Using snapshot of region {region_id} {order_type} orders, valid until {time.ctime(expires_at)}")
+    return snapshot['orders'], snapshot['page_headers']
+
+
+def store_snapshot(region_id: int, order_type: str, orders, page_headers: dict, decoder=None) -> None:
+    """Snapshot a fully fetched order book until the Expires time ESI sent with its page 1."""
+    if not ESI_CACHE_DIR or not page_headers.get('expires'):
+        return
+    snapshot = {'orders': orders, 'page_headers': page_headers}
+    _write_atomically(_snapshot_path(region_id, order_type, decoder, 'pickle'),
+                      lambda snapshot_file: pickle.dump(snapshot, snapshot_file, pickle.HIGHEST_PROTOCOL))
+    metadata = {'expires_at': parsedate_to_datetime(page_headers['expires']).timestamp(),
+                'last_modified': page_headers.get('last-modified')}
+    _write_atomically(_snapshot_path(region_id, order_type, decoder, 'json'),
+                      lambda metadata_file: json.dump(metadata, metadata_file), mode='w')
+
+
+def next_refresh_at(region_ids: list, order_types: tuple, decoder=None):
+    """Return the earliest time any of the given order books gets new data on ESI.
+
+    A scheduler can sleep until then instead of polling; a missing snapshot is due now, so the current time is
+    returned. Returns None when none of them has a snapshot, e.g. after a streaming run, which writes none.
+    """
+    expires_at = [snapshot_expires_at(region_id, order_type, decoder)
+                  for region_id in region_ids for order_type in order_types]
+    if all(expiry is None for expiry in expires_at):
+        return None
+    now = time.time()
+    return min(now if expiry is None else expiry for expiry in expires_at)
+
+
+def load_resolved_names() -> dict:
+    """Return the type names resolved by earlier runs, None for ids ESI does not know."""
+    if not ESI_CACHE_DIR:
+        return {}
+    try:
+        with open(os.path.join(ESI_CACHE_DIR, 'resolved_names.json'), encoding='utf-8') as names_file:
+            return {int(type_id): name for type_id, name in json.load(names_file).items()}
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logging.warning(f"Ignoring corrupt resolved names cache: {e}")
+        return {}
+
+
+def store_resolved_names(names: dict) -> None:
+    """Persist resolved type names, so later runs only ask ESI for ids they have never seen."""
+    if not ESI_CACHE_DIR:
+        return
+    _write_atomically(os.path.join(ESI_CACHE_DIR, 'resolved_names.json'),
+                      lambda names_file: json.dump(names, names_file, ensure_ascii=False), mode='w')
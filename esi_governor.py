@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import threading
+import time
+
+from constants import ERROR_LIMIT_SLOW_DOWN, ERROR_LIMIT_PAUSE
+
+
+class ErrorLimitGovernor:
+    """Paces ESI requests by the error budget ESI reports with every response.
+
+    ESI bans clients that exhaust `X-ESI-Error-Limit-Remain` errors before `X-ESI-Error-Limit-Reset` seconds pass.
+    Every fetch worker asks the shared governor how long to wait before sending a request: nothing while the budget
+    is healthy, and the rest of the window once `pause_below` or fewer errors remain. In between, once fewer than
+    `slow_down_below` remain, requests get send slots spaced evenly over the rest of the window, reserved one after
+    the other however many workers ask at once. The window reset restores full speed.
+    """
+
+    def __init__(self, slow_down_below: int = ERROR_LIMIT_SLOW_DOWN, pause_below: int = ERROR_LIMIT_PAUSE):
+        self.slow_down_below = slow_down_below
+        self.pause_below = pause_below
+        self._lock = threading.Lock()
+        self._remain = None
+        self._reset_at = 0.0
+        self._next_send = 0.0
+
+    def update(self, headers) -> None:
+        """Record the error budget reported in a response's headers."""
+        remain = headers.get('x-esi-error-limit-remain')
+        reset = headers.get('x-esi-error-limit-reset')
+        if remain is None or reset is None:
+            return
+        with self._lock:
+            self._remain = int(remain)
+            self._reset_at = time.monotonic() + int(reset)
+        if int(remain) <= self.pause_below:
+            logging.warning(f"ESI error budget down to {remain}, pausing requests for {reset}s")
+
+    def delay(self) -> float:
+        """Reserve the next send slot and return how many seconds a request should wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            until_reset = self._reset_at - now
+            if self._remain is None or until_reset <= 0 or self._remain >= self.slow_down_below:
+                return 0.0
+            if self._remain <= self.pause_below:
+                return until_reset
+            # Spread the remaining budget over the rest of the window, one slot per request; slots past the reset
+            # need not wait longer, the budget is restored by then
+            self._next_send = max(now, self._next_send) + until_reset / self._remain
+            return min(self._next_send, self._reset_at) - now
+
+    def wait(self) -> None:
+        """Block the calling thread until a request may be sent."""
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self) -> None:
+        """Suspend the calling coroutine until a request may be sent."""
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+governor = ErrorLimitGovernor()
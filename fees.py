@@ -0,0 +1,97 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from spread_kernel import BestBidAsk, spread_table
+from topk import top_k_indices
+
+# Lowest broker fee an NPC station charges, whatever the skills and standings
+MINIMAL_NPC_BROKER_FEE = 0.01
+
+
+class FeeProfile(NamedTuple):
+    """Skills and standings setting the market fees a character pays.
+
+    Fees are fractions of the order value. A `structure_broker_fee` replaces the NPC station broker fee when orders
+    are placed in a player structure.
+    """
+    accounting: int = 5
+    broker_relations: int = 5
+    faction_standing: float = 0.0
+    corporation_standing: float = 0.0
+    structure_broker_fee: float = None
+    base_sales_tax: float = 0.075
+    base_broker_fee: float = 0.03
+
+    @property
+    def sales_tax(self) -> float:
+        """Sales tax, lowered by 11% of the base per level of Accounting."""
+        return self.base_sales_tax * (1 - 0.11 * self.accounting)
+
+    @property
+    def broker_fee(self) -> float:
+        """Broker fee, lowered by Broker Relations and by the station owner's faction and corporation standings."""
+        if self.structure_broker_fee is not None:
+            return self.structure_broker_fee
+        return max(self.base_broker_fee - 0.003 * self.broker_relations - 0.0003 * self.faction_standing
+                   - 0.0002 * self.corporation_standing, MINIMAL_NPC_BROKER_FEE)
+
+
+def _roi(net_profit: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """Return net profit over cost, infinite where nothing is paid."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return net_profit / cost
+
+
+def station_trading_profit(best_ask: np.ndarray, best_bid: np.ndarray, fee_profile: FeeProfile) -> tuple:
+    """Return the net profit and ROI per unit of buying at the best bid and relisting at the best ask.
+
+    Both orders pay the broker fee and the sale pays sales tax.
+    """
+    cost = best_bid * (1 + fee_profile.broker_fee)
+    net_profit = best_ask * (1 - fee_profile.broker_fee - fee_profile.sales_tax) - cost
+    return net_profit, _roi(net_profit, cost)
+
+
+def hauling_profit(buy_prices: np.ndarray, sell_prices: np.ndarray, fee_profile: FeeProfile,
+                   relist: bool = False) -> tuple:
+    """Return the net profit and ROI per unit of buying from sell orders and selling elsewhere at `sell_prices`.
+
+    Buying from sell orders is free of fees. Selling pays sales tax, and the broker fee as well with `relist`.
+    """
+    fee = fee_profile.sales_tax + (fee_profile.broker_fee if relist else 0.0)
+    net_profit = sell_prices * (1 - fee) - buy_prices
+    return net_profit, _roi(net_profit, buy_prices)
+
+
+def net_spread_table(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, best: BestBidAsk,
+                     fee_profile: FeeProfile, minimal_net_profit: float, minimal_roi: float, top_k: int = None,
+                     top_k_metric: str = 'net_profit', volumes: np.ndarray = None) -> pd.DataFrame:
+    """Build the spread table of the types in `best` worth station trading once fees are paid.
+
+    Types are kept on their net profit and ROI, which are added as the `net_profit` and `roi` columns. Types without
+    both a sell and a buy order at the station have neither and are never kept.
+    Given the packaged `volumes` of the types, `profit_per_m3` is added as well.
+    With `top_k` only the `top_k` best types by `top_k_metric` ('spread', 'net_profit', 'roi' or, given `volumes`,
+    'profit_per_m3') are kept, best first, and only their rows are ever built.
+    """
+    net_profit, roi = station_trading_profit(best.best_ask, best.best_bid, fee_profile)
+    both_sides = (best.ask_positions >= 0) & (best.bid_positions >= 0)
+    net_profit = np.where(both_sides, net_profit, np.nan)
+    roi = np.where(both_sides, roi, np.nan)
+    metrics = {'spread': best.spread, 'net_profit': net_profit, 'roi': roi}
+    if volumes is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['profit_per_m3'] = net_profit / volumes
+    rows = np.flatnonzero((net_profit >= minimal_net_profit) & (roi >= minimal_roi))
+    if top_k is not None:
+        metric = np.nan_to_num(metrics[top_k_metric][rows], nan=-np.inf)
+        rows = rows[top_k_indices(metric, top_k)]
+    df_combined = spread_table(df_sell_orders, df_buy_orders, best, rows)
+    df_combined['net_profit'] = net_profit[rows]
+    df_combined['roi'] = roi[rows]
+    if volumes is not None:
+        df_combined['packaged_volume'] = volumes[rows]
+        df_combined['profit_per_m3'] = metrics['profit_per_m3'][rows]
+    return df_combined
@@ -0,0 +1,44 @@
+import threading
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import HTTP_POOL_SIZE, ASYNC_LIMIT_PER_HOST, ESI_USER_AGENT
+
+ESI_HEADERS = {
+    'Accept-Encoding': 'gzip',
+    'Connection': 'keep-alive',
+    'User-Agent': ESI_USER_AGENT,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Create a session keeping up to `pool_size` connections alive, so pages reuse TCP and TLS handshakes.
+
+    The pool blocks instead of opening throwaway connections when more threads than `pool_size` use it.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(ESI_HEADERS)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the session shared by every ESI call of the process, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+    return _session
+
+
+def create_async_session(limit_per_host: int = ASYNC_LIMIT_PER_HOST) -> aiohttp.ClientSession:
+    """Create the aiohttp counterpart of `get_session`; it must be created and closed inside the event loop."""
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=limit_per_host)
+    return aiohttp.ClientSession(connector=connector, headers=ESI_HEADERS)
@@ -1,13 +1,40 @@
-import requests
+import numpy as np
 import pandas as pd
+import requests
+from requests.structures import CaseInsensitiveDict
 from dotenv import load_dotenv
+import argparse
 import os
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timezone
+from functools import partial
 
-from constants import (TYPE_ID_NAME_MAP, MINIMAL_SPREAD, AMARR_STATION_ID, DOMAIN_REGION_ID, THE_FORGE_REGION_ID,
-                       REGION_ID_NAME_MAP, JITA_STATION_ID)
+from constants import (MINIMAL_NET_PROFIT, MINIMAL_ROI, HUB_STATION_IDS, HUB_NAMES, REGION_ID_NAME_MAP,
+                       FETCH_MAX_WORKERS, FETCH_ENGINE, MAX_RETRIES, ESI_REQUEST_TIMEOUT,
+                       BACKOFF_FACTOR, MARKET_ORDERS_URL, FETCH_ALL_ORDER_TYPES, REGION_CONCURRENCY, STREAMING_REDUCE,
+                       DECODE_ORDER_COLUMNS, ARBITRAGE_TOP, ARBITRAGE_MIN_PROFIT, ARBITRAGE_RELIST, ACCOUNTING_LEVEL,
+                       BROKER_RELATIONS_LEVEL, FACTION_STANDING, CORPORATION_STANDING, STRUCTURE_BROKER_FEE,
+                       DEPTH_QUANTITY, DEPTH_BUDGET, TOP_K, TOP_K_METRIC, RESOLVE_UNKNOWN_NAMES,
+                       EXCLUDED_CATEGORY_IDS, INCLUDE_UNPUBLISHED, SNAPSHOT_ARCHIVE_DIR)
+from market_orders import (order_frame, split_orders_by_side, collect_order_pages, order_types_to_fetch,
+                           order_pages_decoder, BestOrderReducer, OrderBookStream, PAGINATION_HEADERS, orjson)
 from send_file import send_email_with_attachment
+from spread_kernel import hub_best_prices, select_types
+from fees import FeeProfile, net_spread_table
+from depth import hub_depth
+from type_name_index import get_type_name_index, UNKNOWN_TYPE_NAME
+from name_resolver import TypeNameResolver
+from type_metadata import open_type_metadata_store, tradable_types
+from arbitrage import top_arbitrage
+from snapshot_archive import open_snapshot_archive
+from replay import captured_region_orders, archived_region_orders, replay_day
+from async_fetch import fetch_regions_orders
+from http_client import get_session
+from esi_governor import governor
+from esi_cache import (load_cached_page, store_cached_page, conditional_request_headers, load_snapshot, store_snapshot,
+                       next_refresh_at)
 
 logging.basicConfig(
     filename='logfile.log',
@@ -17,88 +44,324 @@ logging.basicConfig(
 
 load_dotenv()
 
-regions = ['Domain', 'The Forge', 'Heimatar', 'Metropolis', 'Sinq Laison']
-region_ids = [DOMAIN_REGION_ID, THE_FORGE_REGION_ID]
+# Regions holding a hub station, the only ones fetched
+region_ids = list(HUB_STATION_IDS)
 result_dataframes = {}
+fee_profile = FeeProfile(ACCOUNTING_LEVEL, BROKER_RELATIONS_LEVEL, FACTION_STANDING, CORPORATION_STANDING,
+                         STRUCTURE_BROKER_FEE)
+type_metadata_store = open_type_metadata_store()
+if TOP_K_METRIC == 'profit_per_m3' and type_metadata_store is None:
+    logging.warning("TOP_K_METRIC profit_per_m3 needs the type metadata store, ranking by net_profit instead.")
+    TOP_K_METRIC = 'net_profit'
+snapshot_archive = open_snapshot_archive()
+if DECODE_ORDER_COLUMNS and orjson is None:
+    logging.warning("DECODE_ORDER_COLUMNS is set but orjson is not installed, decoding order pages as plain JSON.")
 
 recipients_from_dotenv = os.environ.get('RECIPIENTS')
 gmail_scopes = os.environ.get('GMAIL_SCOPES')
 
 
-def fetch_with_retries(url, max_retries=5, backoff_factor=2):
-    """Fetch data from the API with retry logic."""
+def fetch_page_with_retries(url, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, decoder=None):
+    """Fetch data from the API with retry logic, returning the decoded body together with the response headers.
+
+    The body is decoded as JSON, or by `decoder` from the raw bytes when given.
+    Pages seen before are revalidated with their ETag; on 304 Not Modified the cached body is returned.
+    Every attempt waits for the shared error limit governor first. Requests time out after `ESI_REQUEST_TIMEOUT`
+    seconds; network errors are retried like error responses.
+    """
+    cached_page = load_cached_page(url, decoder)
     retries = 0
     while retries < max_retries:
-        response = requests.get(url)
-        if response.status_code == 200:
-            try:
-                return response.json()
-            except ValueError:
-                logging.warning(f"Invalid JSON response: {response.text}")
-                return None
+        governor.wait()
+        try:
+            response = get_session().get(url, headers=conditional_request_headers(cached_page),
+                                         timeout=ESI_REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logging.warning(f"Error fetching data: {e}, retrying...\n Failed URL: {url}")
         else:
-            logging.warning(f"Error fetching data: {response.json()}, retrying...\n Failed URL: {url}")
-            retries += 1
-            time.sleep(backoff_factor ** retries)  # Exponential backoff
+            governor.update(response.headers)
+            if response.status_code == 304:
+                headers = CaseInsensitiveDict(cached_page['headers'])
+                headers.update(response.headers)
+                return cached_page['data'], headers
+            elif response.status_code == 200:
+                try:
+                    data = response.json() if decoder is None else decoder(response.content)
+                except ValueError:
+                    logging.warning(f"Invalid JSON response: {response.text}")
+                    return None, response.headers
+                store_cached_page(url, response.headers, data, decoder)
+                return data, response.headers
+            logging.warning(f"Error fetching data: {response.text}, retrying...\n Failed URL: {url}")
+        retries += 1
+        time.sleep(backoff_factor ** retries)  # Exponential backoff
     logging.error(f"Failed to fetch data after {max_retries} retries.")
-    return None
+    return None, {}
 
 
-def create_marketspread_df(region_id: int) -> pd.DataFrame:
-    """Create a DataFrame with the market spread for a given region."""
-    sell_orders_url = f'https://esi.evetech.net/latest/markets/{region_id}/orders/?datasource=tranquility&order_type=sell'
-    buy_orders_url = f'https://esi.evetech.net/latest/markets/{region_id}/orders/?datasource=tranquility&order_type=buy'
+def fetch_with_retries(url, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """Fetch data from the API with retry logic."""
+    return fetch_page_with_retries(url, max_retries, backoff_factor)[0]
 
-    sell_orders_initial = requests.get(sell_orders_url)
-    buy_orders_initial = requests.get(buy_orders_url)
 
-    sell_order_pages = int(sell_orders_initial.headers['x-pages'])+1
-    buy_order_pages = int(buy_orders_initial.headers['x-pages'])+1
+def fetch_pages(urls: list, max_workers: int = FETCH_MAX_WORKERS, decoder=None) -> list:
+    """Fetch the given page URLs on a bounded thread pool.
 
-    final_sell_orders_list = []
-    final_buy_orders_list = []
+    Returns `(data, headers)` tuples in the order of `urls`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(partial(fetch_page_with_retries, decoder=decoder), urls))
 
-    if region_id == DOMAIN_REGION_ID:
-        station_id = AMARR_STATION_ID
-    else:
-        station_id = JITA_STATION_ID
 
-    for sell_order_page in range(1, sell_order_pages):
-        sell_orders_dict = fetch_with_retries(sell_orders_url+f'&page={sell_order_page}')
-        final_sell_orders_list.extend(sell_orders_dict)
+def probe_order_pages(orders_url: str, decoder=None) -> tuple:
+    """Fetch page 1 of an order book, which also tells how many pages it has.
+
+    Returns the page 1 orders, its pagination headers and the URLs of the remaining pages.
+    """
+    first_page, headers = fetch_page_with_retries(orders_url+'&page=1', decoder=decoder)
+    page_headers = {header: headers.get(header) for header in PAGINATION_HEADERS}
+    remaining_page_urls = [orders_url+f'&page={order_page}' for order_page in range(2, int(headers['x-pages'])+1)]
+    return first_page, page_headers, remaining_page_urls
+
+
+def hub_station_ids(region_id: int) -> list:
+    """Return the trade hub stations whose orders are analysed for a given region."""
+    return HUB_STATION_IDS.get(region_id, [])
+
+
+def hub_name(station_id: int) -> str:
+    """Return the name of a trade hub, or its station id when it has none."""
+    return HUB_NAMES.get(station_id, str(station_id))
+
+
+def hub_sheet_name(region_id: int, station_id: int) -> str:
+    """Name a hub's sheet after its region, adding the hub when the region has several."""
+    region_name = REGION_ID_NAME_MAP[region_id]
+    if len(hub_station_ids(region_id)) == 1:
+        return region_name
+    return f"{region_name} - {hub_name(station_id)}"
+
+
+def compute_marketspread_dfs(sell_orders: list, buy_orders: list, station_ids: list) -> tuple:
+    """Compute the market spread of every hub station from its region's sell and buy orders.
+
+    Returns a dict mapping each station id to its DataFrame, together with a dict mapping each station id to the
+    `BestBidAsk` of every type traded there.
+    """
+    df_sell_orders = order_frame(sell_orders)
+    df_buy_orders = order_frame(buy_orders)
+
+    hub_best = hub_best_prices(df_sell_orders, df_buy_orders, station_ids)
+    hub_volumes = dict.fromkeys(hub_best)
+    if type_metadata_store is not None and hub_best:
+        metadata = type_metadata_store.lookup(np.concatenate([best.type_ids for best in hub_best.values()]))
+        for station_id, best in hub_best.items():
+            hub_metadata = metadata.loc[best.type_ids]
+            tradable = tradable_types(hub_metadata, EXCLUDED_CATEGORY_IDS, INCLUDE_UNPUBLISHED)
+            hub_best[station_id] = select_types(best, tradable)
+            hub_volumes[station_id] = hub_metadata['packaged_volume'].to_numpy(dtype=np.float64)[tradable]
+
+    hub_dataframes = {station_id: net_spread_table(df_sell_orders, df_buy_orders, best, fee_profile,
+                                                   MINIMAL_NET_PROFIT, MINIMAL_ROI, TOP_K, TOP_K_METRIC,
+                                                   hub_volumes[station_id])
+                      for station_id, best in hub_best.items()}
+    for df_combined in hub_dataframes.values():
+        df_combined['name'] = get_type_name_index().names(df_combined['type_id'].to_numpy())
+
+    if DEPTH_QUANTITY is not None or DEPTH_BUDGET is not None:
+        depth = hub_depth(df_sell_orders, df_buy_orders, hub_best, DEPTH_QUANTITY, DEPTH_BUDGET)
+        for station_id, df_combined in hub_dataframes.items():
+            rows = df_combined.index.to_numpy()
+            df_combined['depth_volume_sell'] = depth[station_id].sell_volume[rows]
+            df_combined['vwap_sell'] = depth[station_id].vwap_sell[rows]
+            df_combined['depth_volume_buy'] = depth[station_id].buy_volume[rows]
+            df_combined['vwap_buy'] = depth[station_id].vwap_buy[rows]
+            df_combined['effective_spread'] = df_combined['vwap_sell'] - df_combined['vwap_buy']
+
+    return hub_dataframes, hub_best
+
+
+def compute_arbitrage_df(hub_best: dict) -> pd.DataFrame:
+    """Compute the most profitable trades buying at one hub and selling at another, across all fetched regions."""
+    df_arbitrage = top_arbitrage(hub_best, ARBITRAGE_TOP, ARBITRAGE_MIN_PROFIT, fee_profile, MINIMAL_ROI,
+                                 ARBITRAGE_RELIST)
+    df_arbitrage.insert(1, 'name', get_type_name_index().names(df_arbitrage['type_id'].to_numpy()))
+    df_arbitrage.insert(2, 'buy_hub', df_arbitrage['buy_station_id'].map(hub_name).astype('category'))
+    df_arbitrage.insert(3, 'sell_hub', df_arbitrage['sell_station_id'].map(hub_name).astype('category'))
+    if type_metadata_store is not None:
+        metadata = type_metadata_store.lookup(df_arbitrage['type_id'])
+        df_arbitrage['packaged_volume'] = metadata.loc[df_arbitrage['type_id'], 'packaged_volume'].to_numpy()
+        df_arbitrage['profit_per_m3'] = df_arbitrage['net_profit'] / df_arbitrage['packaged_volume']
+    return df_arbitrage
+
+
+def fetch_order_books(region_id: int, order_types: tuple, max_workers: int = FETCH_MAX_WORKERS,
+                      decoder=None) -> dict:
+    """Fetch every page of the given order types of a region on one pool of at most `max_workers` threads.
+
+    Order books whose snapshot has not expired yet are served from disk without any request.
+    Returns a dict mapping each order type to its `(orders, page_headers)` tuple.
+    """
+    order_books = {}
+    probes = {}
+    for order_type in order_types:
+        snapshot = load_snapshot(region_id, order_type, decoder)
+        if snapshot is not None:
+            order_books[order_type] = snapshot
+        else:
+            probes[order_type] = probe_order_pages(MARKET_ORDERS_URL.format(region_id=region_id,
+                                                                            order_type=order_type), decoder)
+
+    pages = iter(fetch_pages([url for _, _, page_urls in probes.values() for url in page_urls], max_workers,
+                             decoder))
+    for order_type, (first_page, page_headers, page_urls) in probes.items():
+        orders = collect_order_pages(first_page, page_headers, [next(pages) for _ in page_urls])
+        store_snapshot(region_id, order_type, orders, page_headers, decoder)
+        order_books[order_type] = orders, page_headers
+    return order_books
+
+
+def fetch_region_orders(region_id: int, max_workers: int = FETCH_MAX_WORKERS,
+                        all_order_types: bool = FETCH_ALL_ORDER_TYPES,
+                        decode_columns: bool = DECODE_ORDER_COLUMNS) -> tuple:
+    """Fetch the `(sell_orders, buy_orders)` of a region.
+
+    With `all_order_types` the region is paginated once with `order_type=all` and split into sell and buy orders
+    in memory, which halves the number of requests. Otherwise sell and buy order pages are fetched together.
+    With `decode_columns` the orders are dicts of typed columns holding only the fields in `ORDER_COLUMNS`.
+    """
+    order_books = fetch_order_books(region_id, order_types_to_fetch(all_order_types), max_workers,
+                                    order_pages_decoder(decode_columns))
+    if all_order_types:
+        orders, _ = order_books['all']
+        return split_orders_by_side(orders)
+    return order_books['sell'][0], order_books['buy'][0]
+
+
+def stream_order_books(region_id: int, order_types: tuple, reducer: BestOrderReducer,
+                       max_workers: int = FETCH_MAX_WORKERS, decoder=None) -> None:
+    """Fold every page of the given order types of a region into `reducer` as it arrives, see `OrderBookStream`."""
+    page_urls = {}
+    for order_type in order_types:
+        stream = OrderBookStream(reducer)
+        if stream.add_snapshot(load_snapshot(region_id, order_type, decoder)):
+            continue
+        orders_url = MARKET_ORDERS_URL.format(region_id=region_id, order_type=order_type)
+        for page_number in stream.add_first_page(*fetch_page_with_retries(orders_url+'&page=1', decoder=decoder)):
+            page_urls[orders_url+f'&page={page_number}'] = stream, page_number
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_page_with_retries, url, decoder=decoder): page
+                   for url, page in page_urls.items()}
+        for future in as_completed(futures):
+            stream, page_number = futures.pop(future)
+            stream.add_page(page_number, *future.result())
+
+
+def create_marketspread_dfs(region_id: int, max_workers: int = FETCH_MAX_WORKERS,
+                            all_order_types: bool = FETCH_ALL_ORDER_TYPES,
+                            streaming: bool = STREAMING_REDUCE,
+                            decode_columns: bool = DECODE_ORDER_COLUMNS, run_started_at: datetime = None) -> dict:
+    """Create a DataFrame with the market spread of every hub station in a given region.
+
+    Returns the spreads and best prices of `compute_marketspread_dfs`.
+    """
+    station_ids = hub_station_ids(region_id)
+    if streaming:
+        reducer = BestOrderReducer(station_ids)
+        stream_order_books(region_id, order_types_to_fetch(all_order_types), reducer, max_workers,
+                           order_pages_decoder(decode_columns))
+        return compute_marketspread_dfs(reducer.sell_orders(), reducer.buy_orders(), station_ids)
+
+    df_sell_orders, df_buy_orders = map(order_frame, fetch_region_orders(region_id, max_workers, all_order_types,
+                                                                         decode_columns))
+    result = compute_marketspread_dfs(df_sell_orders, df_buy_orders, station_ids)
+    archive_region_orders(region_id, run_started_at, df_sell_orders, df_buy_orders)
+    return result
+
 
-    for buy_order_page in range(1, buy_order_pages):
-        buy_orders_dict = fetch_with_retries(buy_orders_url+f'&page={buy_order_page}')
-        final_buy_orders_list.extend(buy_orders_dict)
+def process_region(region_id: int, region_orders: dict = None, run_started_at: datetime = None) -> tuple:
+    """Compute the market spread of a region's hubs, fetching its orders unless `region_orders` already holds them."""
+    logging.info(f"Processing region: {REGION_ID_NAME_MAP[region_id]}")
+    if region_orders is not None:
+        sell_orders, buy_orders = region_orders[region_id]
+        return compute_marketspread_dfs(sell_orders, buy_orders, hub_station_ids(region_id))
+    return create_marketspread_dfs(region_id, run_started_at=run_started_at)
 
-    df_sell_orders = pd.DataFrame(final_sell_orders_list)
-    df_sell_orders = df_sell_orders[df_sell_orders['location_id'] == station_id]
-    df_sell_orders_min_price = df_sell_orders.loc[df_sell_orders.groupby('type_id')['price'].idxmin()]
 
-    df_buy_orders = pd.DataFrame(final_buy_orders_list)
-    df_buy_orders = df_buy_orders[df_buy_orders['location_id'] == station_id]
-    df_buy_orders_max_price = df_buy_orders.loc[df_buy_orders.groupby('type_id')['price'].idxmax()]
+def archive_region_orders(region_id: int, run_started_at: datetime, sell_orders, buy_orders) -> None:
+    """Queue a region's fetched orders for the snapshot archive, written in the background, if it is enabled."""
+    if snapshot_archive is not None:
+        snapshot_archive.submit(region_id, run_started_at, sell_orders, buy_orders)
 
-    df_combined = pd.merge(df_sell_orders_min_price, df_buy_orders_max_price, on='type_id', how='outer',
-                           suffixes=('_sell', '_buy'))
-    df_combined['price_sell'] = df_combined['price_sell'].fillna(0)
-    df_combined['price_buy'] = df_combined['price_buy'].fillna(0)
 
-    df_combined['market_spread_station_only'] = df_combined['price_sell'] - df_combined['price_buy']
-    df_combined = df_combined[df_combined['market_spread_station_only'] >= MINIMAL_SPREAD]
-    df_combined['name'] = df_combined['type_id'].map(TYPE_ID_NAME_MAP)
+def name_unknown_types(dataframes: dict, offline: bool = False) -> None:
+    """Resolve the types of `dataframes` missing from the type name table in bulk, then rename them in place.
 
-    return df_combined
+    With `offline` only names resolved by earlier runs are used and ESI is not asked.
+    """
+    unknown_type_ids = set()
+    for df in dataframes.values():
+        unknown_type_ids.update(df.loc[df['name'] == UNKNOWN_TYPE_NAME, 'type_id'].tolist())
+    if not unknown_type_ids:
+        return
+    logging.info(f"Resolving names of {len(unknown_type_ids)} unknown types")
+    type_name_index = get_type_name_index()
+    resolver = TypeNameResolver()
+    type_name_index.add_names(resolver.cached_names(unknown_type_ids) if offline
+                              else resolver.resolve(unknown_type_ids))
+    for df in dataframes.values():
+        df['name'] = type_name_index.names(df['type_id'].to_numpy())
 
 
-def main() -> None:
-    file_name = 'markets_spreads.xlsx'
+def main(fetch_engine: str = FETCH_ENGINE, region_concurrency: int = REGION_CONCURRENCY, region_orders: dict = None,
+         file_name: str = 'markets_spreads.xlsx', send_email: bool = True) -> None:
+    """Build the spreads spreadsheet and email it.
+
+    Up to `region_concurrency` regions are processed at once. With `fetch_engine='async'` the orders of all regions
+    are fetched up front over one event loop, otherwise each region fetches its own with the thread pool fetcher.
+    Given recorded `region_orders`, a dict mapping region ids to their `(sell_orders, buy_orders)`, those regions
+    are replayed instead: nothing is fetched or archived, and unknown types are only named from earlier runs.
+    """
     output_path = os.path.join(os.getcwd(), file_name)
-    for region in region_ids:
-        region_name = REGION_ID_NAME_MAP[region]
-        logging.info(f"Processing region: {region_name}")
-        df = create_marketspread_df(region)
-        result_dataframes[region_name] = df
+    run_started_at = datetime.now(timezone.utc)
+    result_dataframes.clear()
+    replaying = region_orders is not None
+    if replaying:
+        if not region_orders:
+            logging.warning("No recorded order books to replay")
+            return
+        regions_to_process = list(region_orders)
+    else:
+        regions_to_process = region_ids
+        if fetch_engine == 'async':
+            hub_stations = {region: hub_station_ids(region) for region in region_ids} if STREAMING_REDUCE else None
+            region_orders = fetch_regions_orders(region_ids, hub_station_ids=hub_stations)
+            for region in region_orders:
+                # Each region's decoded pages are dropped as soon as its compact frames are built
+                region_orders[region] = tuple(order_frame(orders) for orders in region_orders[region])
+                if not STREAMING_REDUCE:
+                    archive_region_orders(region, run_started_at, *region_orders[region])
+    with ThreadPoolExecutor(max_workers=region_concurrency) as executor:
+        region_results = list(executor.map(process_region, regions_to_process,
+                                           [region_orders] * len(regions_to_process),
+                                           [run_started_at] * len(regions_to_process)))
+    hub_best = {}
+    for region, (hub_dataframes, region_hub_best) in zip(regions_to_process, region_results):
+        for station_id, df in hub_dataframes.items():
+            result_dataframes[hub_sheet_name(region, station_id)] = df
+        hub_best.update(region_hub_best)
+    if len(hub_best) > 1:
+        result_dataframes['Arbitrage'] = compute_arbitrage_df(hub_best)
+
+    if RESOLVE_UNKNOWN_NAMES:
+        name_unknown_types(result_dataframes, offline=replaying)
+
+    if not replaying:
+        refresh_at = next_refresh_at(region_ids, order_types_to_fetch(FETCH_ALL_ORDER_TYPES),
+                                     order_pages_decoder(DECODE_ORDER_COLUMNS))
+        if refresh_at is not None:
+            logging.info(f"Next market data due at {time.ctime(refresh_at)}")
 
     with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
         for df in result_dataframes:
@@ -106,15 +369,62 @@ def main() -> None:
 
     sender = os.environ.get('EMAIL')
     recipients = [item.strip() for item in os.getenv('RECIPIENTS', "").split(",") if item]
-    subject = "EVE Market Domain and The Forge Region Spreads"
-    body_text = "Cześć, \nTabelka w załączniku. Spready zaczynają się od 10 mln ISK. \n\nPozdrawiam, \nPtysiu"
+    region_names = [REGION_ID_NAME_MAP.get(region, str(region)) for region in regions_to_process]
+    subject = f"EVE Market {', '.join(region_names)} Region Spreads"
+    body_text = (f"Cześć, \nTabelka w załączniku. Zysk netto po podatku i opłatach maklerskich zaczyna się od "
+                 f"{MINIMAL_NET_PROFIT / 1e6:g} mln ISK. \n\nPozdrawiam, \nPtysiu")
+
+    if send_email:
+        for recipient in recipients:
+            send_email_with_attachment(sender, recipient, subject, body_text, file_name)
+
+    if snapshot_archive is not None:
+        snapshot_archive.wait()
 
-    for recipient in recipients:
-        send_email_with_attachment(sender, recipient, subject, body_text, file_name)
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the EVE market spreads spreadsheet and email it.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--replay-archive', metavar='DIRECTORY', nargs='?', const=SNAPSHOT_ARCHIVE_DIR,
+                        help="replay the snapshot archive in DIRECTORY, SNAPSHOT_ARCHIVE_DIR by default, instead of "
+                             "fetching from ESI")
+    source.add_argument('--replay-captures', action='store_true',
+                        help="replay the order book snapshots in ESI_CACHE_DIR, expired or not, instead of fetching "
+                             "from ESI")
+    parser.add_argument('--at', type=pd.Timestamp,
+                        help="with --replay-archive, replay the latest snapshots taken at or before this time (UTC "
+                             "unless given)")
+    parser.add_argument('--day', type=date.fromisoformat,
+                        help="with --replay-archive, replay every run started on this day (UTC, YYYY-MM-DD), one "
+                             "spreadsheet per run")
+    parser.add_argument('--email', action='store_true', help="email the spreadsheets of a replay too")
+    args = parser.parse_args(argv)
+    if args.replay_archive == '':
+        parser.error("--replay-archive needs a DIRECTORY when SNAPSHOT_ARCHIVE_DIR is not set")
+    if (args.at is not None or args.day is not None) and args.replay_archive is None:
+        parser.error("--at and --day need --replay-archive")
+    if args.at is not None and args.at.tzinfo is None:
+        args.at = args.at.tz_localize('UTC')
+    return args
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run `main` live, or on the recorded order books `args` asks to replay."""
+    if args.replay_captures:
+        main(region_orders=captured_region_orders(region_ids), send_email=args.email)
+    elif args.replay_archive is not None and args.day is not None:
+        for run_started_at, region_orders in replay_day(args.replay_archive, args.day):
+            logging.info(f"Replaying the run started at {run_started_at}")
+            main(region_orders=region_orders, file_name=f'markets_spreads-{run_started_at:%Y%m%d-%H%M%S}.xlsx',
+                 send_email=args.email)
+    elif args.replay_archive is not None:
+        main(region_orders=archived_region_orders(args.replay_archive, args.at), send_email=args.email)
+    else:
+        main()
 
 
 if __name__ == '__main__':
     try:
-        main()
+        run(parse_args())
     except Exception as e:
         logging.error(e)
@@ -0,0 +1,94 @@
+import logging
+import time
+from collections.abc import Mapping
+
+import requests
+
+from constants import UNIVERSE_NAMES_URL, MAX_RETRIES, BACKOFF_FACTOR, ESI_REQUEST_TIMEOUT
+from esi_cache import load_resolved_names, store_resolved_names
+from esi_governor import governor
+from http_client import get_session
+
+# Most ids /universe/names/ accepts in one request
+NAMES_PER_REQUEST = 1000
+
+
+def post_universe_names(type_ids: list, max_retries: int = MAX_RETRIES, backoff_factor: int = BACKOFF_FACTOR):
+    """Ask ESI for the names of up to `NAMES_PER_REQUEST` ids in one POST to /universe/names/.
+
+    Returns ESI's `{'id', 'name', 'category'}` entries, or None when ESI rejects the batch for holding an id it
+    does not know. Network errors are retried like error responses. Raises ConnectionError once every retry failed.
+    """
+    retries = 0
+    while retries < max_retries:
+        governor.wait()
+        try:
+            response = get_session().post(UNIVERSE_NAMES_URL, json=[int(type_id) for type_id in type_ids],
+                                          timeout=ESI_REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logging.warning(f"Error resolving names: {e}, retrying...")
+        else:
+            governor.update(response.headers)
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 404:
+                return None
+            logging.warning(f"Error resolving names: {response.text}, retrying...")
+        retries += 1
+        time.sleep(backoff_factor ** retries)  # Exponential backoff
+    raise ConnectionError(f"Failed to resolve names after {max_retries} retries.")
+
+
+def local_names_source(type_names: Mapping):
+    """Return a stand-in for `post_universe_names` answering from `type_names`, rejecting batches like ESI does."""
+    def post_local_names(type_ids: list):
+        if any(type_id not in type_names for type_id in type_ids):
+            return None
+        return [{'id': type_id, 'name': type_names[type_id], 'category': 'inventory_type'} for type_id in type_ids]
+    return post_local_names
+
+
+class TypeNameResolver:
+    """Resolves the names of type ids missing from the type name table, `NAMES_PER_REQUEST` ids per round trip.
+
+    Names are kept in a persistent cache that is read before asking `source`, and ids ESI does not know are
+    cached too, so no id is ever asked for twice. A batch ESI rejects is split in halves until the ids it does
+    not know are isolated.
+    """
+
+    def __init__(self, source=post_universe_names):
+        self.source = source
+        self._names = load_resolved_names()
+
+    def resolve(self, type_ids) -> dict:
+        """Return the names of the `type_ids` that have one."""
+        type_ids = {int(type_id) for type_id in type_ids}
+        missing = sorted(type_ids - self._names.keys())
+        try:
+            for start in range(0, len(missing), NAMES_PER_REQUEST):
+                self._resolve_batch(missing[start:start + NAMES_PER_REQUEST])
+        except ConnectionError as e:
+            logging.error(f"{e} Leaving {len(type_ids - self._names.keys())} types unnamed.")
+        if missing:
+            store_resolved_names(self._names)
+        return self.cached_names(type_ids)
+
+    def cached_names(self, type_ids) -> dict:
+        """Return the names of the `type_ids` resolved before, without asking `source` for any."""
+        return {int(type_id): self._names[int(type_id)] for type_id in type_ids
+                if self._names.get(int(type_id)) is not None}
+
+    def _resolve_batch(self, type_ids: list) -> None:
+        entries = self.source(type_ids)
+        if entries is None:
+            if len(type_ids) == 1:
+                self._names[type_ids[0]] = None
+                return
+            self._resolve_batch(type_ids[:len(type_ids) // 2])
+            self._resolve_batch(type_ids[len(type_ids) // 2:])
+            return
+        for entry in entries:
+            if entry.get('category') == 'inventory_type':
+                self._names[entry['id']] = entry['name']
+        for type_id in type_ids:
+            self._names.setdefault(type_id, None)
@@ -0,0 +1,93 @@
+"""Recorded order books to replay the pipeline on instead of fetching them from ESI.
+
+Order books are read back from the snapshot archive, or from the order book snapshots in ESI_CACHE_DIR whether
+they expired or not, as the `{region_id: (sell_orders, buy_orders)}` dicts `main.main` takes as `region_orders`.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from constants import ESI_CACHE_DIR, FETCH_ALL_ORDER_TYPES, DECODE_ORDER_COLUMNS, SNAPSHOT_ARCHIVE_DIR
+from esi_cache import load_snapshot
+from market_orders import order_types_to_fetch, order_pages_decoder, split_orders_by_side
+from snapshot_archive import read_manifest, read_archived_orders
+
+
+def captured_region_orders(region_ids: list, all_order_types: bool = FETCH_ALL_ORDER_TYPES,
+                           decode_columns: bool = DECODE_ORDER_COLUMNS) -> dict:
+    """Return the orders of `region_ids` from the snapshots in ESI_CACHE_DIR, fetched with the same settings.
+
+    Regions without a snapshot are left out.
+    """
+    decoder = order_pages_decoder(decode_columns)
+    region_orders = {}
+    for region_id in region_ids:
+        order_books = {order_type: load_snapshot(region_id, order_type, decoder, include_expired=True)
+                       for order_type in order_types_to_fetch(all_order_types)}
+        if any(order_book is None for order_book in order_books.values()):
+            logging.warning(f"No recorded order book of region {region_id} in {ESI_CACHE_DIR}, skipping it")
+            continue
+        if all_order_types:
+            region_orders[region_id] = split_orders_by_side(order_books['all'][0])
+        else:
+            region_orders[region_id] = order_books['sell'][0], order_books['buy'][0]
+    return region_orders
+
+
+def _read_run(directory: str, entries: pd.DataFrame) -> dict:
+    return {int(entry.region_id): read_archived_orders(os.path.join(directory, entry.path))
+            for entry in entries.itertuples()}
+
+
+def archived_region_orders(directory: str = SNAPSHOT_ARCHIVE_DIR, at: pd.Timestamp = None) -> dict:
+    """Return the orders of every archived region from its latest snapshot taken at or before `at`, or at all."""
+    manifest = read_manifest(directory)
+    if at is not None:
+        manifest = manifest[manifest['fetched_at'] <= at]
+    return _read_run(directory, manifest.groupby('region_id').tail(1))
+
+
+def archived_runs(manifest: pd.DataFrame) -> list:
+    """Split manifest entries into the runs that wrote them, in the order they ran.
+
+    Entries are grouped by run id. Entries archived without one are split where a region they hold comes again.
+    """
+    runs = [entries for _, entries in manifest.dropna(subset=['run_id']).groupby('run_id', sort=True)]
+    run_start = 0
+    run_regions = set()
+    legacy_manifest = manifest[manifest['run_id'].isna()]
+    for position, region_id in enumerate(legacy_manifest['region_id']):
+        if region_id in run_regions:
+            runs.append(legacy_manifest.iloc[run_start:position])
+            run_start = position
+            run_regions = set()
+        run_regions.add(region_id)
+    if run_start < len(legacy_manifest):
+        runs.append(legacy_manifest.iloc[run_start:])
+    return sorted(runs, key=_run_started_at)
+
+
+def _run_started_at(entries: pd.DataFrame) -> pd.Timestamp:
+    started_at = entries['run_id'].iloc[0]
+    return entries['fetched_at'].iloc[0] if pd.isna(started_at) else started_at
+
+
+def replay_day(directory: str, day: date):
+    """Yield the `(run_started_at, region_orders)` of every run started on `day` (UTC), in the order they ran.
+
+    The next run is read on a background thread while the caller processes the current one, so replaying is bound
+    by computing alone.
+    """
+    runs = [run for run in archived_runs(read_manifest(directory)) if _run_started_at(run).date() == day]
+    if not runs:
+        logging.warning(f"No runs archived on {day} in {directory}")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_run = executor.submit(_read_run, directory, runs[0]) if runs else None
+        for position, run in enumerate(runs):
+            region_orders = next_run.result()
+            if position + 1 < len(runs):
+                next_run = executor.submit(_read_run, directory, runs[position + 1])
+            yield _run_started_at(run), region_orders
@@ -0,0 +1,127 @@
+"""Archive of every fetched order book as compressed Parquet files, partitioned by date and region.
+
+A region's sell and buy orders are written together as
+<SNAPSHOT_ARCHIVE_DIR>/date=<YYYY-MM-DD>/region_id=<region id>/<HHMMSSffffff>.parquet
+named after the start time of the run that fetched it, which is also its run id, with the compact dtypes of
+`order_frame`, and each file gets a line in <SNAPSHOT_ARCHIVE_DIR>/manifest.jsonl.
+Needs pyarrow; without it nothing is archived.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from constants import SNAPSHOT_ARCHIVE_DIR, SNAPSHOT_ARCHIVE_COLUMNS, SNAPSHOT_ARCHIVE_COMPRESSION
+from market_orders import order_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+MANIFEST_FILE_NAME = 'manifest.jsonl'
+
+
+def _archive_columns(columns: str):
+    """Return the order fields to archive from a comma separated list, or None for 'all'."""
+    if columns.strip().lower() == 'all':
+        return None
+    return [column.strip() for column in columns.split(',') if column.strip()]
+
+
+class SnapshotArchive:
+    """Writes order books to the archive on a background thread, so fetching and computing never wait on disk.
+
+    Orders handed to `submit` are converted and written in the order they were submitted; `wait` blocks until
+    all of them are on disk. A snapshot failing to write is logged and skipped.
+    """
+
+    def __init__(self, directory: str, columns=None, compression: str = SNAPSHOT_ARCHIVE_COMPRESSION):
+        self.directory = directory
+        self.columns = columns
+        self.compression = compression
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot-archive')
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, region_id: int, run_started_at: datetime, sell_orders, buy_orders) -> None:
+        """Queue the sell and buy orders of a region, as just fetched by the run started at `run_started_at`."""
+        fetched_at = datetime.now(timezone.utc)
+        future = self._executor.submit(self._write, region_id, run_started_at, fetched_at, sell_orders, buy_orders)
+        with self._lock:
+            self._futures.append((region_id, future))
+
+    def wait(self) -> None:
+        """Block until every submitted snapshot is written."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for region_id, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Failed to archive orders of region {region_id}: {e}")
+
+    def _write(self, region_id: int, run_started_at: datetime, fetched_at: datetime, sell_orders, buy_orders) -> None:
+        df_orders = pd.concat([order_frame(sell_orders), order_frame(buy_orders)], ignore_index=True)
+        if self.columns is not None:
+            columns = ['price_cents' if column == 'price' else column for column in self.columns]
+            df_orders = df_orders[[column for column in columns if column in df_orders]]
+
+        # Partitioned and named by the run, so a run's files never cross midnight nor overwrite another run's
+        relative_path = os.path.join(f'date={run_started_at:%Y-%m-%d}', f'region_id={region_id}',
+                                     f'{run_started_at:%H%M%S%f}.parquet')
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        pq.write_table(pa.Table.from_pandas(df_orders, preserve_index=False), temporary_path,
+                       compression=self.compression)
+        os.replace(temporary_path, path)
+
+        entry = {'path': relative_path, 'region_id': region_id, 'run_id': run_started_at.isoformat(),
+                 'fetched_at': fetched_at.isoformat(), 'orders': len(df_orders), 'columns': list(df_orders.columns),
+                 'bytes': os.path.getsize(path)}
+        with open(os.path.join(self.directory, MANIFEST_FILE_NAME), 'a', encoding='utf-8') as manifest_file:
+            manifest_file.write(json.dumps(entry) + '\n')
+        logging.info(f"Archived {len(df_orders)} orders of region {region_id} to {path}")
+
+
+def open_snapshot_archive(directory: str = SNAPSHOT_ARCHIVE_DIR, columns: str = SNAPSHOT_ARCHIVE_COLUMNS):
+    """Return the archive writing to `directory`, or None when archiving is off or pyarrow is missing."""
+    if not directory:
+        return None
+    if pq is None:
+        logging.warning("SNAPSHOT_ARCHIVE_DIR is set but pyarrow is not installed, not archiving order books.")
+        return None
+    return SnapshotArchive(directory, _archive_columns(columns))
+
+
+def read_manifest(directory: str = SNAPSHOT_ARCHIVE_DIR) -> pd.DataFrame:
+    """Return the manifest of the archive, one row per snapshot in the order they were written.
+
+    `run_id` is the start time of the run that archived the snapshot, NaT for snapshots archived without one.
+    """
+    entries = []
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE_NAME), encoding='utf-8') as manifest_file:
+            entries = [json.loads(line) for line in manifest_file if line.strip()]
+    except FileNotFoundError:
+        pass
+    manifest = pd.DataFrame(entries, columns=['path', 'region_id', 'run_id', 'fetched_at', 'orders', 'columns',
+                                              'bytes'])
+    for column in ('run_id', 'fetched_at'):
+        manifest[column] = pd.to_datetime(manifest[column], utc=True, format='ISO8601')
+    return manifest
+
+
+def read_archived_orders(path: str) -> tuple:
+    """Return the `(sell_orders, buy_orders)` of an archived snapshot as compact order DataFrames."""
+    if pq is None:
+        raise ImportError("Reading archived order books needs pyarrow")
+    df_orders = pq.read_table(path).to_pandas()
+    is_buy_order = df_orders['is_buy_order'].to_numpy()
+    return (df_orders[~is_buy_order].reset_index(drop=True), df_orders[is_buy_order].reset_index(drop=True))
@@ -0,0 +1,164 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Largest type id + 1 for which `type_codes` indexes a dense table instead of factorizing
+DENSE_TYPE_ID_LIMIT = 1 << 22
+
+
+class BestBidAsk(NamedTuple):
+    """Best prices of every type traded at a station, sorted by type id.
+
+    A type without sell (buy) orders has a best ask (bid) of 0 and an ask (bid) position of -1.
+    Positions index the rows of the sell and buy orders the prices were computed from.
+    """
+    type_ids: np.ndarray
+    best_ask: np.ndarray
+    best_bid: np.ndarray
+    spread: np.ndarray
+    ask_positions: np.ndarray
+    bid_positions: np.ndarray
+
+
+def order_prices(df_orders: pd.DataFrame) -> np.ndarray:
+    """Return the prices of orders in ISK, from `price_cents` in a compact order DataFrame."""
+    if 'price_cents' in df_orders:
+        return df_orders['price_cents'].to_numpy() / 100
+    return df_orders['price'].to_numpy()
+
+
+def type_codes(*type_id_arrays: np.ndarray) -> tuple:
+    """Return the sorted unique type ids of the given arrays and, for each array, its codes into them.
+
+    Type ids are small integers, so a dense presence table replaces hashing or sorting whenever they fit in one.
+    """
+    all_type_ids = np.concatenate(type_id_arrays)
+    if len(all_type_ids) and 0 <= all_type_ids.min() and all_type_ids.max() < DENSE_TYPE_ID_LIMIT:
+        present = np.zeros(all_type_ids.max() + 1, dtype=bool)
+        present[all_type_ids] = True
+        type_ids = np.flatnonzero(present)
+        codes = (np.cumsum(present) - 1)[all_type_ids]
+    else:
+        codes, type_ids = pd.factorize(all_type_ids, sort=True)
+    bounds = np.cumsum([len(array) for array in type_id_arrays])[:-1]
+    return type_ids, np.split(codes, bounds)
+
+
+def best_order_positions(codes: np.ndarray, prices: np.ndarray, type_count: int, highest: bool = False) -> tuple:
+    """Return the lowest (or `highest`) price of every type code and the position of the order holding it.
+
+    Both are segment reductions scattered straight into per-type arrays, so the orders are never sorted.
+    Equal prices keep the earliest order like `idxmin`/`idxmax` do. Types without orders get a price of 0
+    and a position of -1.
+    """
+    prices = prices.astype(np.float64, copy=False)
+    best_prices = np.full(type_count, -np.inf if highest else np.inf)
+    (np.maximum if highest else np.minimum).at(best_prices, codes, prices)
+
+    at_best_price = np.flatnonzero(prices == best_prices[codes])
+    positions = np.full(type_count, len(prices))
+    np.minimum.at(positions, codes[at_best_price], at_best_price)
+
+    missing = positions == len(prices)
+    best_prices[missing] = 0.0
+    positions[missing] = -1
+    return best_prices, positions
+
+
+def _order_rows(rows: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Translate positions into a subset of orders back into positions into all orders, keeping -1 as is."""
+    order_rows = np.full(len(positions), -1)
+    has_order = positions >= 0
+    order_rows[has_order] = rows[positions[has_order]]
+    return order_rows
+
+
+def hub_best_bid_ask(sell_location_ids: np.ndarray, sell_type_ids: np.ndarray, sell_prices: np.ndarray,
+                     buy_location_ids: np.ndarray, buy_type_ids: np.ndarray, buy_prices: np.ndarray,
+                     station_ids: list) -> dict:
+    """Compute the best ask, best bid and spread of every type at every hub station in one grouped pass over
+    (location_id, type_id).
+
+    Orders anywhere else are skipped. Returns a dict mapping each station id, in the order given, to its
+    `BestBidAsk`, whose positions index the orders as given.
+    """
+    hubs = np.unique(station_ids)
+    sell_rows = np.flatnonzero(np.isin(sell_location_ids, hubs))
+    buy_rows = np.flatnonzero(np.isin(buy_location_ids, hubs))
+    type_ids, (sell_codes, buy_codes) = type_codes(sell_type_ids[sell_rows], buy_type_ids[buy_rows])
+    group_count = len(hubs) * len(type_ids)
+
+    sell_groups = np.searchsorted(hubs, sell_location_ids[sell_rows]) * len(type_ids) + sell_codes
+    buy_groups = np.searchsorted(hubs, buy_location_ids[buy_rows]) * len(type_ids) + buy_codes
+    best_ask, ask_positions = best_order_positions(sell_groups, sell_prices[sell_rows], group_count)
+    best_bid, bid_positions = best_order_positions(buy_groups, buy_prices[buy_rows], group_count, highest=True)
+
+    hub_best = {}
+    for station_id in dict.fromkeys(station_ids):
+        hub = np.searchsorted(hubs, station_id)
+        groups = slice(hub * len(type_ids), (hub + 1) * len(type_ids))
+        traded = np.flatnonzero((ask_positions[groups] >= 0) | (bid_positions[groups] >= 0))
+        hub_best_ask = best_ask[groups][traded]
+        hub_best_bid = best_bid[groups][traded]
+        hub_best[station_id] = BestBidAsk(type_ids[traded], hub_best_ask, hub_best_bid, hub_best_ask - hub_best_bid,
+                                          _order_rows(sell_rows, ask_positions[groups][traded]),
+                                          _order_rows(buy_rows, bid_positions[groups][traded]))
+    return hub_best
+
+
+def select_types(best: BestBidAsk, keep: np.ndarray) -> BestBidAsk:
+    """Return `best` restricted to the types where `keep` is True."""
+    return BestBidAsk(*(array[keep] for array in best))
+
+
+def _gather_side(df_orders: pd.DataFrame, positions: np.ndarray, type_ids: np.ndarray,
+                 side_has_gaps: bool) -> pd.DataFrame:
+    """Gather the best order rows of one side, with NaN rows for types that side has no order for.
+
+    When the side lacks any type of the full table, its columns are upcast the way an outer merge upcasts them,
+    even if no such type is among the gathered rows.
+    """
+    has_order = positions >= 0
+    side = df_orders.iloc[positions[has_order]].drop(columns='type_id').rename(columns={'price_cents': 'price'})
+    side.index = type_ids[has_order]
+    if side_has_gaps:
+        return side.reindex(np.append(type_ids, -1)).iloc[:-1]
+    return side.reindex(type_ids)
+
+
+def combine_best_orders(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, best: BestBidAsk,
+                        rows: np.ndarray) -> pd.DataFrame:
+    """Build the table an outer merge of the best sell and buy orders on `type_id` gives, for `rows` of `best` only.
+
+    Columns on both sides get `_sell` and `_buy` suffixes and prices are in ISK. Only the selected rows are ever
+    materialized.
+    """
+    type_ids = best.type_ids[rows]
+    df_sell_side = _gather_side(df_sell_orders, best.ask_positions[rows], type_ids, (best.ask_positions < 0).any())
+    df_buy_side = _gather_side(df_buy_orders, best.bid_positions[rows], type_ids, (best.bid_positions < 0).any())
+    shared_columns = df_sell_side.columns.intersection(df_buy_side.columns)
+    df_sell_side.columns = [f'{column}_sell' if column in shared_columns else column for column in df_sell_side]
+    df_buy_side.columns = [f'{column}_buy' if column in shared_columns else column for column in df_buy_side]
+
+    df_combined = pd.concat([df_sell_side, df_buy_side], axis=1)
+    df_combined.insert(int(df_sell_orders.columns.get_loc('type_id')), 'type_id', type_ids)
+    df_combined.index = rows
+    df_combined['price_sell'] = best.best_ask[rows]
+    df_combined['price_buy'] = best.best_bid[rows]
+    return df_combined
+
+
+def spread_table(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, best: BestBidAsk,
+                 rows: np.ndarray) -> pd.DataFrame:
+    """Build the spread table of `rows` of `best`."""
+    df_combined = combine_best_orders(df_sell_orders, df_buy_orders, best, rows)
+    df_combined['market_spread_station_only'] = best.spread[rows]
+    return df_combined
+
+
+def hub_best_prices(df_sell_orders: pd.DataFrame, df_buy_orders: pd.DataFrame, station_ids: list) -> dict:
+    """Compute the `BestBidAsk` of every hub station from a region's sell and buy orders, see `hub_best_bid_ask`."""
+    return hub_best_bid_ask(df_sell_orders['location_id'].to_numpy(), df_sell_orders['type_id'].to_numpy(),
+                            order_prices(df_sell_orders), df_buy_orders['location_id'].to_numpy(),
+                            df_buy_orders['type_id'].to_numpy(), order_prices(df_buy_orders), station_ids)
@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from name_resolver import NAMES_PER_REQUEST, TypeNameResolver, local_names_source
+
+TYPE_NAMES = {type_id: f'Type {type_id}' for type_id in range(1, 2501)}
+UNKNOWN_TYPE_ID = 999_999_999
+
+
+class RecordingSource:
+    """`local_names_source` over `TYPE_NAMES`, recording the batches it is asked for."""
+
+    def __init__(self):
+        self.source = local_names_source(TYPE_NAMES)
+        self.batches = []
+
+    def __call__(self, type_ids: list):
+        self.batches.append(list(type_ids))
+        return self.source(type_ids)
+
+
+class TypeNameResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        cache_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_directory.cleanup)
+        patcher = mock.patch('esi_cache.ESI_CACHE_DIR', cache_directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolves_in_batches_of_names_per_request(self):
+        source = RecordingSource()
+        names = TypeNameResolver(source).resolve(TYPE_NAMES)
+
+        self.assertEqual(names, TYPE_NAMES)
+        self.assertEqual([len(batch) for batch in source.batches], [NAMES_PER_REQUEST, NAMES_PER_REQUEST, 500])
+
+    def test_rejected_batch_is_split_until_the_unknown_id_is_isolated(self):
+        source = RecordingSource()
+        type_ids = list(range(1, 9)) + [UNKNOWN_TYPE_ID]
+        names = TypeNameResolver(source).resolve(type_ids)
+
+        self.assertEqual(names, {type_id: TYPE_NAMES[type_id] for type_id in range(1, 9)})
+        self.assertEqual(source.batches[0], sorted(type_ids))
+        self.assertIn([UNKNOWN_TYPE_ID], source.batches)
+        # Halving a batch of 9 isolates the unknown id in 4 rejected batches, each split in two
+        self.assertEqual(len(source.batches), 1 + 2 * 4)
+
+    def test_cached_names_and_unknown_ids_are_never_asked_again(self):
+        type_ids = [1, 2, 3, UNKNOWN_TYPE_ID]
+        names = TypeNameResolver(RecordingSource()).resolve(type_ids)
+
+        source = RecordingSource()
+        resolver = TypeNameResolver(source)
+        self.assertEqual(resolver.resolve(type_ids), names)
+        self.assertEqual(resolver.cached_names(type_ids), names)
+        self.assertEqual(source.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
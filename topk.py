@@ -0,0 +1,47 @@
+import heapq
+
+import numpy as np
+
+
+def top_k_indices(values: np.ndarray, k: int = None) -> np.ndarray:
+    """Return the positions of the `k` largest values, largest first, or of all values when `k` is None.
+
+    The `k` values are picked with `argpartition` and only they get sorted. Equal values keep their order when
+    every value is returned. No positions are returned when `k` is 0 or less.
+    """
+    if k is not None and k <= 0:
+        return np.arange(0)
+    if k is not None and k < len(values):
+        positions = np.argpartition(values, len(values) - k)[len(values) - k:]
+    else:
+        positions = np.arange(len(values))
+    return positions[np.argsort(-values[positions], kind='stable')]
+
+
+class TopKAccumulator:
+    """Keeps the `k` highest scored items of batches added one at a time, e.g. as a streaming pipeline yields them.
+
+    Each batch is cut down to its own top `k` before being merged into a heap of at most `k` entries, so memory
+    stays bounded by `k` whatever the number of batches. On equal scores the item added first wins.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []
+        self._added = 0
+
+    def add(self, scores: np.ndarray, items) -> None:
+        """Merge a batch of `items` with their `scores` into the running top `k`."""
+        for position in top_k_indices(scores, self.k):
+            entry = (scores[position], -self._added, items[position])
+            self._added += 1
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+            else:
+                break  # The rest of the batch scores lower still
+
+    def items(self) -> list:
+        """Return the kept items, highest score first."""
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
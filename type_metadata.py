@@ -0,0 +1,98 @@
+"""Local SQLite store of type attributes, built from the SDE dump files.
+
+Build it from a directory holding the Fuzzwork CSV dumps invTypes, invGroups, invCategories and, for packaged
+volumes, invVolumes (plain .csv or .csv.bz2) with:
+python type_metadata.py <sde_directory> [type_metadata.sqlite]
+"""
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from constants import TYPE_METADATA_PATH
+
+# Attributes stored for every type
+TYPE_METADATA_COLUMNS = ['type_id', 'group_id', 'group_name', 'category_id', 'category_name', 'volume',
+                         'packaged_volume', 'published']
+
+
+def _read_sde_table(sde_directory: str, table: str, columns: list, required: bool = True) -> pd.DataFrame:
+    for file_name in (f'{table}.csv', f'{table}.csv.bz2'):
+        path = os.path.join(sde_directory, file_name)
+        if os.path.exists(path):
+            return pd.read_csv(path, usecols=columns, na_values=['None'])
+    if required:
+        raise FileNotFoundError(f"No {table}.csv or {table}.csv.bz2 in {sde_directory}")
+    return pd.DataFrame(columns=columns)
+
+
+def build_type_metadata_store(sde_directory: str, path: str = TYPE_METADATA_PATH) -> None:
+    """Build the store from the SDE dumps in `sde_directory`, replacing any store at `path` at once."""
+    types = _read_sde_table(sde_directory, 'invTypes', ['typeID', 'groupID', 'volume', 'published'])
+    groups = _read_sde_table(sde_directory, 'invGroups', ['groupID', 'categoryID', 'groupName'])
+    categories = _read_sde_table(sde_directory, 'invCategories', ['categoryID', 'categoryName'])
+    packaged_volumes = _read_sde_table(sde_directory, 'invVolumes', ['typeID', 'volume'], required=False)
+
+    metadata = types.merge(groups, on='groupID', how='left').merge(categories, on='categoryID', how='left')
+    metadata['packaged_volume'] = metadata['typeID'].map(packaged_volumes.set_index('typeID')['volume'])
+    metadata['packaged_volume'] = metadata['packaged_volume'].fillna(metadata['volume'])
+    metadata = metadata.rename(columns={'typeID': 'type_id', 'groupID': 'group_id', 'groupName': 'group_name',
+                                        'categoryID': 'category_id', 'categoryName': 'category_name'})
+    metadata['published'] = metadata['published'].fillna(0).astype(bool)
+    metadata = metadata[TYPE_METADATA_COLUMNS].astype(object).where(metadata[TYPE_METADATA_COLUMNS].notna(), None)
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with sqlite3.connect(temporary_path) as connection:
+        connection.execute('DROP TABLE IF EXISTS types')
+        connection.execute('CREATE TABLE types (type_id INTEGER PRIMARY KEY, group_id INTEGER, group_name TEXT, '
+                           'category_id INTEGER, category_name TEXT, volume REAL, packaged_volume REAL, '
+                           'published INTEGER)')
+        connection.executemany(f'INSERT INTO types VALUES ({", ".join("?" * len(TYPE_METADATA_COLUMNS))})',
+                               metadata.itertuples(index=False, name=None))
+        connection.execute('CREATE INDEX types_category_id ON types (category_id)')
+    connection.close()
+    os.replace(temporary_path, path)
+
+
+class TypeMetadataStore:
+    """Read access to the type metadata store, joining type attributes onto many type ids at once."""
+
+    def __init__(self, path: str = TYPE_METADATA_PATH):
+        self.path = path
+
+    def lookup(self, type_ids) -> pd.DataFrame:
+        """Return the attributes of `type_ids` indexed by type id, with NaN rows for types the store lacks.
+
+        The ids are loaded into a temporary table and joined on the primary key in one query.
+        """
+        type_ids = pd.unique(np.asarray(type_ids, dtype=np.int64))
+        connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        try:
+            connection.execute('CREATE TEMP TABLE wanted (type_id INTEGER PRIMARY KEY)')
+            connection.executemany('INSERT INTO wanted VALUES (?)', ((int(type_id),) for type_id in type_ids))
+            metadata = pd.read_sql_query('SELECT types.* FROM wanted JOIN types USING (type_id)', connection,
+                                         index_col='type_id')
+        finally:
+            connection.close()
+        return metadata.reindex(type_ids)
+
+
+def open_type_metadata_store(path: str = TYPE_METADATA_PATH):
+    """Return the store at `path`, or None when it has not been built."""
+    return TypeMetadataStore(path) if os.path.exists(path) else None
+
+
+def tradable_types(metadata: pd.DataFrame, excluded_category_ids: list, include_unpublished: bool) -> np.ndarray:
+    """Return which types of `metadata` pass the filters; types the store lacks always do."""
+    known = metadata['category_id'].notna().to_numpy()
+    excluded = metadata['category_id'].isin(excluded_category_ids).to_numpy()
+    unpublished = ~metadata['published'].fillna(True).astype(bool).to_numpy()
+    if include_unpublished:
+        unpublished[:] = False
+    return ~known | ~(excluded | unpublished)
+
+
+if __name__ == '__main__':
+    build_type_metadata_store(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else TYPE_METADATA_PATH)
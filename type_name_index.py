@@ -0,0 +1,58 @@
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+import constants
+
+# Name given to type ids the names do not know
+UNKNOWN_TYPE_NAME = 'Unknown type'
+
+_type_name_index = None
+_type_name_index_lock = threading.Lock()
+
+
+class TypeNameIndex:
+    """Resolves type ids to names as one vectorized gather instead of a lookup per row.
+
+    Names are deduplicated into the categories of a categorical dtype, and a dense array indexed by type id holds
+    the category code of every id up to the largest one known. Every other id resolves to `UNKNOWN_TYPE_NAME`.
+    """
+
+    def __init__(self, type_names: Mapping):
+        type_ids = np.fromiter(type_names.keys(), np.int64, len(type_names))
+        name_codes, names = pd.factorize(np.array(list(type_names.values()), dtype=object))
+        self.dtype = pd.CategoricalDtype([*names, UNKNOWN_TYPE_NAME])
+        self._unknown_code = len(names)
+        self._codes = np.full(type_ids.max() + 1 if len(type_ids) else 0, self._unknown_code, dtype=np.int32)
+        self._codes[type_ids] = name_codes
+
+    def add_names(self, type_names: Mapping) -> None:
+        """Teach the index more names, e.g. resolved for ids the type name table does not know."""
+        if not type_names:
+            return
+        type_ids = np.fromiter(type_names.keys(), np.int64, len(type_names))
+        new_names = pd.Index(list(dict.fromkeys(type_names.values()))).difference(self.dtype.categories, sort=False)
+        self.dtype = pd.CategoricalDtype([*self.dtype.categories, *new_names])
+        if type_ids.max() >= len(self._codes):
+            self._codes = np.concatenate([self._codes, np.full(type_ids.max() + 1 - len(self._codes),
+                                                               self._unknown_code, dtype=np.int32)])
+        self._codes[type_ids] = self.dtype.categories.get_indexer(list(type_names.values()))
+
+    def names(self, type_ids) -> pd.Categorical:
+        """Return the names of `type_ids` as a categorical sharing this index's categories."""
+        type_ids = np.asarray(type_ids)
+        known = (type_ids >= 0) & (type_ids < len(self._codes))
+        codes = np.full(len(type_ids), self._unknown_code, dtype=np.int32)
+        codes[known] = self._codes[type_ids[known]]
+        return pd.Categorical.from_codes(codes, dtype=self.dtype)
+
+
+def get_type_name_index() -> TypeNameIndex:
+    """Return the index of `TYPE_ID_NAME_MAP` shared by the whole process, building it on first use."""
+    global _type_name_index
+    with _type_name_index_lock:
+        if _type_name_index is None:
+            _type_name_index = TypeNameIndex(constants.TYPE_ID_NAME_MAP)
+    return _type_name_index
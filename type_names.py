@@ -0,0 +1,95 @@
+"""Compact on-disk table of type names, memory-mapped and looked up lazily.
+
+The table file holds a header, the sorted type ids as little-endian int32, the offsets of every name as uint32 and
+the UTF-8 encoded names back to back. Rebuild it from a JSON object mapping type ids to names with:
+python type_names.py <names.json> [type_names.bin]
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+MAGIC = b'TYPENAME'
+VERSION = 1
+_HEADER = struct.Struct('<8sII')
+
+
+def _int_array(buffer, start: int, end: int, typecode: str):
+    """View a little-endian run of 4 byte integers of `buffer` as a sequence, copying only on big-endian hosts."""
+    view = memoryview(buffer)[start:end].cast(typecode)
+    if sys.byteorder == 'little':
+        return view
+    swapped = array(typecode, view)
+    swapped.byteswap()
+    return swapped
+
+
+class TypeNameTable(Mapping):
+    """Read-only mapping of type ids to names, backed by a memory-mapped table file.
+
+    Opening the table maps the file without reading it. A lookup bisects the sorted ids and decodes only the name
+    asked for, so only the pages touched are ever loaded.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} type name table")
+        ids_end = _HEADER.size + 4 * count
+        offsets_end = ids_end + 4 * (count + 1)
+        self._type_ids = _int_array(self._buffer, _HEADER.size, ids_end, 'i')
+        self._offsets = _int_array(self._buffer, ids_end, offsets_end, 'I')
+        self._names_start = offsets_end
+
+    def _index(self, type_id) -> int:
+        try:
+            index = bisect_left(self._type_ids, type_id)
+        except TypeError:
+            raise KeyError(type_id) from None
+        if index == len(self._type_ids) or self._type_ids[index] != type_id:
+            raise KeyError(type_id)
+        return index
+
+    def __getitem__(self, type_id) -> str:
+        index = self._index(type_id)
+        start = self._names_start + self._offsets[index]
+        end = self._names_start + self._offsets[index + 1]
+        return self._buffer[start:end].decode('utf-8')
+
+    def __contains__(self, type_id) -> bool:
+        try:
+            self._index(type_id)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._type_ids)
+
+    def __len__(self) -> int:
+        return len(self._type_ids)
+
+
+def write_type_name_table(type_names: dict, path: str) -> None:
+    """Write a mapping of type ids to names as a table file `TypeNameTable` can open."""
+    type_ids = sorted(type_names)
+    names = [type_names[type_id].encode('utf-8') for type_id in type_ids]
+    offsets = [0]
+    for name in names:
+        offsets.append(offsets[-1] + len(name))
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(type_ids)))
+        file.write(struct.pack(f'<{len(type_ids)}i', *type_ids))
+        file.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        file.write(b''.join(names))
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1], encoding='utf-8') as names_file:
+        source_names = {int(type_id): name for type_id, name in json.load(names_file).items()}
+    write_type_name_table(source_names, sys.argv[2] if len(sys.argv) > 2 else 'type_names.bin')